@@ -0,0 +1,101 @@
+"""Compare the structure-aware LegalTextSplitter against the old CharacterTextSplitter settings.
+
+Usage:
+    python benchmarks/chunking_benchmark.py [--pdf PATH] [--k 3 5]
+
+The PDF is parsed once; each splitter then chunks, embeds and indexes the same pages.
+Reported per splitter: chunk count, index size on disk, split and embed time, and
+recall@k (dense and hybrid) on benchmarks/retrieval_queries.jsonl.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_text_splitters import CharacterTextSplitter  # noqa: E402
+from legal.chunking import LegalTextSplitter  # noqa: E402
+from legal.embeddings import get_embedding_engine  # noqa: E402
+from legal.ingest import parse_file  # noqa: E402
+from legal.retrieval import BM25Index, HybridRetriever  # noqa: E402
+from retrieval_eval import DEFAULT_PDF, DEFAULT_QUERIES, evaluate  # noqa: E402
+
+SPLITTERS = {
+    "char-1500/200": lambda: CharacterTextSplitter(chunk_size=1500, chunk_overlap=200),
+    "char-2000/500": lambda: CharacterTextSplitter(chunk_size=2000, chunk_overlap=500),
+    "legal-1500": lambda: LegalTextSplitter(chunk_size=1500),
+    "legal-2000": lambda: LegalTextSplitter(chunk_size=2000),
+}
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(dirpath, name)) for dirpath, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--splitters", nargs="+", default=list(SPLITTERS), choices=list(SPLITTERS))
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    # Parse cold: a page cache left by an earlier run would turn the timing into a cache read
+    os.environ["PDF_PAGE_CACHE"] = "off"
+    started = time.perf_counter()
+    _, documents, error = parse_file(os.path.dirname(args.pdf), os.path.basename(args.pdf))
+    if error:
+        raise SystemExit(error)
+    print(f"Parsed {len(documents)} pages in {time.perf_counter() - started:.1f}s")
+
+    engine = get_embedding_engine()
+    engine.warm_up()
+    work_dir = tempfile.mkdtemp(prefix="chunking_benchmark_")
+    header = (
+        f"{'splitter':<15}{'chunks':>8}{'avg chars':>11}{'index MB':>10}{'split s':>9}{'embed s':>9}"
+        + "".join(f"{'dense R@' + str(k):>12}" for k in args.k)
+        + "".join(f"{'hybrid R@' + str(k):>13}" for k in args.k)
+    )
+    print(header)
+    print("-" * len(header))
+    try:
+        for name in args.splitters:
+            splitter = SPLITTERS[name]()
+            started = time.perf_counter()
+            chunks = splitter.split_documents(documents)
+            split_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            vectorstore = FAISS.from_documents(chunks, engine)
+            embed_s = time.perf_counter() - started
+
+            index_dir = os.path.join(work_dir, name)
+            vectorstore.save_local(index_dir)
+            bm25 = BM25Index.from_vectorstore(vectorstore)
+            bm25.save(os.path.join(index_dir, "bm25.json"))
+
+            max_k = max(args.k)
+            dense, _ = evaluate(HybridRetriever(vectorstore, bm25, k=max_k, mode="dense"), queries, args.k)
+            hybrid, _ = evaluate(HybridRetriever(vectorstore, bm25, k=max_k, mode="hybrid"), queries, args.k)
+            print(
+                f"{name:<15}{len(chunks):>8}{sum(len(c.page_content) for c in chunks) / len(chunks):>11.0f}"
+                f"{_dir_size(index_dir) / 2**20:>10.2f}{split_s:>9.2f}{embed_s:>9.1f}"
+                + "".join(f"{dense[k]:>12.2f}" for k in args.k)
+                + "".join(f"{hybrid[k]:>13.2f}" for k in args.k)
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Memory, build time and recall@k of the compressed index modes against the exact flat index.
+
+Usage:
+    python benchmarks/index_benchmark.py [--n 100000] [--dim 768] [--modes hnsw hnsw-sq ivf-sq ivfpq]
+    python benchmarks/index_benchmark.py --index-dir vector_db_dir/<user_id>
+
+Synthetic vectors are drawn from a Gaussian mixture (embeddings cluster by topic, which
+uniform noise would not capture). With --index-dir the vectors of a real persisted
+index are used instead. Memory is the serialized index size scaled to 100k vectors.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+from legal.utils import percentile  # noqa: E402
+from legal.vectorstore import INDEX_MODES, INDEX_NAME, build_serving_index, live_index_dir  # noqa: E402
+
+
+def synthetic_vectors(n, dim, n_clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def recall_at_k(found, truth, k):
+    return float(np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--modes", nargs="+", default=[m for m in INDEX_MODES if m != "flat"], choices=INDEX_MODES)
+    parser.add_argument("--index-dir", help="benchmark the vectors of a persisted index instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.index_dir:
+        live_dir = live_index_dir(args.index_dir)
+        if live_dir is None:
+            raise SystemExit(f"No index found in {args.index_dir}")
+        stored = faiss.read_index(os.path.join(live_dir, f"{INDEX_NAME}.faiss"))
+        vectors = stored.reconstruct_n(0, stored.ntotal)
+    else:
+        vectors = synthetic_vectors(args.n, args.dim)
+    n, dim = vectors.shape
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(n, size=min(args.queries, n), replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    max_k = max(args.k)
+
+    started = time.perf_counter()
+    flat = faiss.IndexFlatL2(dim)
+    flat.add(vectors)
+    flat_build = time.perf_counter() - started
+    _, truth = flat.search(queries, max_k)
+
+    print(f"{n} vectors x {dim} dims, {len(queries)} queries\n")
+    header = (
+        f"{'mode':<10}{'MB/100k':>10}{'build s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        + "".join(f"{'R@' + str(k):>8}" for k in args.k)
+    )
+    print(header)
+    print("-" * len(header))
+
+    def report(name, index, build_s):
+        size_mb = faiss.serialize_index(index).nbytes / 2**20 * 100_000 / n
+        latencies = []
+        found = []
+        for query in queries:
+            t0 = time.perf_counter()
+            _, ids = index.search(query[None, :], max_k)
+            latencies.append(1000 * (time.perf_counter() - t0))
+            found.append(ids[0])
+        print(
+            f"{name:<10}{size_mb:>10.1f}{build_s:>10.1f}"
+            f"{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+            + "".join(f"{recall_at_k(found, truth, k):>8.3f}" for k in args.k)
+        )
+
+    report("flat", flat, flat_build)
+    for mode in args.modes:
+        started = time.perf_counter()
+        index = build_serving_index(flat, mode)
+        report(mode, index, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-page PDF extraction timing: native text layer, page cache, and the Unstructured baseline.
+
+Usage:
+    python benchmarks/pdf_extract_benchmark.py [--pdf PATH] [--backend auto] [--rows 25] [--skip-baseline]
+
+The PDF is extracted twice through legal/pdf_extract.py against a fresh page cache: once
+cold (native text layer, OCR for pages without one) and once warm (every page from the
+cache). The baseline is the old path, UnstructuredFileLoader(mode="paged") on the whole
+file, which can't be timed per page, so its per-page figure is the average.
+Reported: the slowest --rows pages, per-page percentiles, pages by extraction method,
+cache size against the raw text, and the speedup of each path over the baseline.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from legal.pdf_extract import PageCache, extract_pages, native_backend  # noqa: E402
+from legal.utils import percentile  # noqa: E402
+
+DEFAULT_PDF = os.path.join(ROOT, "data", "20240716890312078.pdf")
+
+
+def time_unstructured(pdf_path):
+    """Seconds for the old whole-file Unstructured parse, or None if it isn't installed"""
+    try:
+        from langchain_community.document_loaders import UnstructuredFileLoader
+    except ImportError:
+        return None
+    started = time.perf_counter()
+    UnstructuredFileLoader(pdf_path, mode="paged").load()
+    return time.perf_counter() - started
+
+
+def timed_extract(pdf_path, cache, backend):
+    started = time.perf_counter()
+    pages = extract_pages(pdf_path, cache=cache, backend=backend)
+    return pages, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--backend", default="auto", choices=("auto", "pdfium", "pypdf"))
+    parser.add_argument("--rows", type=int, default=25, help="slowest pages to list (0 = every page)")
+    parser.add_argument("--skip-baseline", action="store_true", help="don't time the Unstructured parse")
+    args = parser.parse_args()
+
+    backend = native_backend() if args.backend == "auto" else args.backend
+    cache_dir = tempfile.mkdtemp(prefix="pdf_extract_benchmark_")
+    try:
+        cache_path = os.path.join(cache_dir, "pdf_pages.sqlite3")
+        cache = PageCache(cache_path)
+        cold, cold_seconds = timed_extract(args.pdf, cache, backend)
+        warm, warm_seconds = timed_extract(args.pdf, cache, backend)
+        cache_bytes = sum(
+            os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)
+        )
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    baseline_seconds = None if args.skip_baseline else time_unstructured(args.pdf)
+
+    print(f"{os.path.basename(args.pdf)}: {len(cold)} pages, native backend {backend}\n")
+    header = f"{'page':>6}{'chars':>8}{'method':>8}{'cold ms':>10}{'cached ms':>11}"
+    print(header)
+    print("-" * len(header))
+    rows = sorted(zip(cold, warm), key=lambda pair: pair[0]["ms"], reverse=True)
+    for page, cached in rows[:args.rows or None]:
+        print(
+            f"{page['page']:>6}{len(page['text']):>8}{page['method']:>8}"
+            f"{page['ms']:>10.1f}{cached['ms']:>11.3f}"
+        )
+    if args.rows and len(rows) > args.rows:
+        print(f"{'...':>6}  ({len(rows) - args.rows} faster pages not shown)")
+
+    cold_ms = [page["ms"] for page in cold]
+    methods = {}
+    for page in cold:
+        methods[page["method"]] = methods.get(page["method"], 0) + 1
+    raw_bytes = sum(len(page["text"].encode("utf-8")) for page in cold)
+    print(
+        f"\nper page (cold): p50 {percentile(cold_ms, 50):.1f} ms, p95 {percentile(cold_ms, 95):.1f} ms, "
+        f"max {max(cold_ms):.1f} ms"
+    )
+    print("pages by method: " + ", ".join(f"{method} {count}" for method, count in sorted(methods.items())))
+    print(f"page cache: {cache_bytes / 1024:.0f} KiB on disk for {raw_bytes / 1024:.0f} KiB of text")
+
+    print(f"\n{'path':<28}{'total s':>10}{'ms/page':>10}{'speedup':>10}")
+    print("-" * 58)
+    results = [("unstructured (baseline)", baseline_seconds), (f"native ({backend}) + OCR", cold_seconds),
+               ("page cache hit", warm_seconds)]
+    for name, seconds in results:
+        if seconds is None:
+            reason = "skipped" if args.skip_baseline else "not installed"
+            print(f"{name:<28}{reason:>10}")
+            continue
+        speedup = f"{baseline_seconds / seconds:.1f}x" if baseline_seconds else "-"
+        print(f"{name:<28}{seconds:>10.2f}{1000 * seconds / len(cold):>10.2f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""End-to-end RAG benchmark that needs no API key: ingest, retrieval, packing and a stubbed Gemini.
+
+Usage:
+    python benchmarks/rag_benchmark.py [--users 1 8 32] [--stub-latency-ms 300] [--failure-rate 0.02]
+    python benchmarks/rag_benchmark.py --json results.json --baseline baseline.json --tolerance 0.25
+
+The bundled PDF is ingested into a temporary directory, then the query workload
+(benchmarks/retrieval_queries.jsonl by default; any JSONL with a "query" field works)
+is replayed by 1, 8 and 32 concurrent simulated users. Each user has its own GeminiChat
+backed by legal/gemini_stub.py (GEMINI_BACKEND=stub), so answers are deterministic and
+the limiter and response cache are out of the way. Reported: ingest throughput, QPS,
+end-to-end latency percentiles, per-stage p95, error rate and process RSS.
+With --baseline the run exits non-zero when p95 latency or QPS regress beyond --tolerance.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before legal.gemini is imported
+os.environ["GEMINI_BACKEND"] = "stub"
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+from legal.context import pack_context  # noqa: E402
+from legal.gemini import GeminiChat  # noqa: E402
+from legal.retrieval import HybridRetriever  # noqa: E402
+from legal.tracing import get_tracer  # noqa: E402
+from legal.utils import percentile  # noqa: E402
+from legal.vectorstore import ingest_documents, load_bm25, load_vectorstore  # noqa: E402
+from retrieval_eval import DEFAULT_PDF, DEFAULT_QUERIES  # noqa: E402
+
+STAGES = ("retrieval.embed_query", "retrieval.faiss_search", "retrieval.bm25", "gemini.call", "gemini.rate_limit_wait")
+
+
+def rss_mb():
+    """Current resident set size (falls back to the peak where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def ingest(pdf_path, work_dir):
+    data_dir = os.path.join(work_dir, "data")
+    vector_db_dir = os.path.join(work_dir, "vector_db_dir")
+    os.makedirs(os.path.join(data_dir, "bench"), exist_ok=True)
+    shutil.copy(pdf_path, os.path.join(data_dir, "bench"))
+    counts = {}
+
+    def progress(files_parsed, files_total, chunks_embedded):
+        counts.update(files=files_total, chunks=chunks_embedded)
+
+    started = time.perf_counter()
+    success, message = ingest_documents(data_dir, vector_db_dir, "bench", progress=progress)
+    seconds = time.perf_counter() - started
+    if not success:
+        raise SystemExit(message)
+    size_mb = os.path.getsize(pdf_path) / 2**20
+    return os.path.join(vector_db_dir, "bench"), {
+        "seconds": seconds,
+        "files": counts.get("files", 0),
+        "chunks": counts.get("chunks", 0),
+        "chunks_per_s": counts.get("chunks", 0) / seconds,
+        "mb_per_s": size_mb / seconds,
+        "rss_mb": rss_mb(),
+    }
+
+
+def run_level(retriever, queries, users, queries_per_user, args):
+    latencies, retrieve_ms, generate_ms = [], [], []
+    errors = 0
+    lock = threading.Lock()
+
+    def simulate_user(user_index):
+        nonlocal errors
+        chat = GeminiChat(api_key=None, default_model=args.model, cache=None)
+        chat.retry_delay = args.retry_delay
+        tracer = get_tracer()
+        for i in range(queries_per_user):
+            # Users start at different offsets so they don't move through the workload in lockstep
+            query = queries[(user_index + i) % len(queries)]["query"]
+            with tracer.request(f"bench-{user_index}"):
+                started = time.perf_counter()
+                documents = retriever.get_relevant_documents(query)
+                context, _ = pack_context(documents, token_budget=args.token_budget)
+                retrieved = time.perf_counter()
+                answer = chat.generate_response(query, context=context)
+                finished = time.perf_counter()
+            with lock:
+                latencies.append(1000 * (finished - started))
+                retrieve_ms.append(1000 * (retrieved - started))
+                generate_ms.append(1000 * (finished - retrieved))
+                errors += answer.startswith("❌")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(simulate_user, range(users)))
+    wall = time.perf_counter() - started
+    return {
+        "users": users,
+        "queries": len(latencies),
+        "qps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "retrieve_p95_ms": percentile(retrieve_ms, 95),
+        "generate_p95_ms": percentile(generate_ms, 95),
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "rss_mb": rss_mb(),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regressions (empty when the run is within tolerance)"""
+    regressions = []
+    previous = {level["users"]: level for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        before = previous.get(level["users"])
+        if before is None:
+            continue
+        if level["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{level['users']} users: p95 {before['p95_ms']:.0f} -> {level['p95_ms']:.0f} ms")
+        if level["qps"] < before["qps"] * (1 - tolerance):
+            regressions.append(f"{level['users']} users: QPS {before['qps']:.2f} -> {level['qps']:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSONL workload with a 'query' field per line")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries-per-user", type=int, help="default: the size of the workload")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--token-budget", type=int, default=6000)
+    parser.add_argument("--model", default="gemini-2.0-flash")
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="backoff base in seconds for stub failures")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results JSON from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    os.environ["GEMINI_STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+    os.environ["GEMINI_STUB_FAILURE_RATE"] = str(args.failure_rate)
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    queries_per_user = args.queries_per_user or len(queries)
+
+    work_dir = tempfile.mkdtemp(prefix="rag_benchmark_")
+    # A fresh page cache per run, so extraction is timed cold rather than served from an earlier run
+    os.environ["PDF_PAGE_CACHE"] = os.path.join(work_dir, "pdf_pages.sqlite3")
+    try:
+        index_dir, ingest_stats = ingest(args.pdf, work_dir)
+        print(
+            f"Ingest: {ingest_stats['chunks']} chunks in {ingest_stats['seconds']:.1f}s "
+            f"({ingest_stats['chunks_per_s']:.1f} chunks/s, {ingest_stats['mb_per_s']:.2f} MB/s), "
+            f"RSS {ingest_stats['rss_mb']:.0f} MB"
+        )
+
+        vectorstore = load_vectorstore(index_dir)
+        retriever = HybridRetriever(vectorstore, load_bm25(index_dir, vectorstore), k=args.k)
+        retriever.get_relevant_documents(queries[0]["query"])  # warm up model / caches
+
+        header = (
+            f"{'users':>6}{'queries':>9}{'QPS':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'retr p95':>10}{'gen p95':>9}{'errors':>8}{'RSS MB':>8}"
+        )
+        print(f"\nstub latency {args.stub_latency_ms:.0f} ms, failure rate {args.failure_rate:.2%}\n")
+        print(header)
+        print("-" * len(header))
+        levels = []
+        for users in args.users:
+            level = run_level(retriever, queries, users, queries_per_user, args)
+            levels.append(level)
+            print(
+                f"{users:>6}{level['queries']:>9}{level['qps']:>8.2f}{level['p50_ms']:>9.0f}{level['p95_ms']:>9.0f}"
+                f"{level['p99_ms']:>9.0f}{level['retrieve_p95_ms']:>10.0f}{level['generate_p95_ms']:>9.0f}"
+                f"{level['error_rate']:>8.1%}{level['rss_mb']:>8.0f}"
+            )
+
+        stage_latency = get_tracer().snapshot()["latency_ms"]
+        print("\nper-stage p95 (all levels): " + ", ".join(
+            f"{stage} {stage_latency[stage]['p95']:.1f} ms" for stage in STAGES if stage in stage_latency
+        ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {"ingest": ingest_stats, "levels": levels, "stages": stage_latency}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions beyond tolerance:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nWithin {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
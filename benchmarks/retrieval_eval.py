@@ -0,0 +1,116 @@
+"""Recall@k and latency of dense, BM25 and hybrid retrieval over the bundled Constitution PDF.
+
+Usage:
+    python benchmarks/retrieval_eval.py [--rerank] [--index-dir DIR]
+
+Without --index-dir the PDF is ingested through vectorize_data into a temporary directory.
+A query counts as a hit at k if any of the top-k chunks contains one of its
+`relevant_text` snippets or comes from one of its `relevant_pages`.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from legal.retrieval import HybridRetriever  # noqa: E402
+from legal.utils import percentile  # noqa: E402
+from legal.vectorstore import load_bm25, load_vectorstore, vectorize_data  # noqa: E402
+
+DEFAULT_PDF = os.path.join(ROOT, "data", "20240716890312078.pdf")
+DEFAULT_QUERIES = os.path.join(ROOT, "benchmarks", "retrieval_queries.jsonl")
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def is_relevant(document, item):
+    if document.metadata.get("page_number") in item.get("relevant_pages", []):
+        return True
+    text = _normalize(document.page_content)
+    return any(_normalize(snippet) in text for snippet in item.get("relevant_text", []))
+
+
+def build_index(pdf_path, work_dir):
+    data_dir = os.path.join(work_dir, "data")
+    vector_db_dir = os.path.join(work_dir, "vector_db_dir")
+    os.makedirs(os.path.join(data_dir, "bench"), exist_ok=True)
+    shutil.copy(pdf_path, os.path.join(data_dir, "bench"))
+    started = time.perf_counter()
+    success, message = vectorize_data(data_dir, vector_db_dir, "bench")
+    if not success:
+        raise SystemExit(message)
+    print(f"Ingested {os.path.basename(pdf_path)} in {time.perf_counter() - started:.1f}s")
+    return os.path.join(vector_db_dir, "bench")
+
+
+def evaluate(retriever, queries, ks):
+    hits = {k: 0 for k in ks}
+    latencies = []
+    for item in queries:
+        started = time.perf_counter()
+        documents = retriever.get_relevant_documents(item["query"])
+        latencies.append(1000 * (time.perf_counter() - started))
+        for k in ks:
+            if any(is_relevant(doc, item) for doc in documents[:k]):
+                hits[k] += 1
+    return {k: hits[k] / len(queries) for k in ks}, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--index-dir", help="reuse an already-built index instead of ingesting the PDF")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--rerank", action="store_true", help="also evaluate hybrid + cross-encoder rerank")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    work_dir = None
+    index_dir = args.index_dir
+    if index_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="retrieval_eval_")
+        # A fresh page cache per run, so extraction is timed cold rather than served from an earlier run
+        os.environ["PDF_PAGE_CACHE"] = os.path.join(work_dir, "pdf_pages.sqlite3")
+        index_dir = build_index(args.pdf, work_dir)
+
+    try:
+        vectorstore = load_vectorstore(index_dir)
+        bm25 = load_bm25(index_dir, vectorstore)
+        modes = [("dense", {}), ("bm25", {}), ("hybrid", {})]
+        if args.rerank:
+            modes.append(("hybrid+rerank", {"rerank": True, "rerank_top_n": 20, "latency_budget_ms": float("inf")}))
+
+        max_k = max(args.k)
+        header = f"{'mode':<15}" + "".join(f"{'R@' + str(k):>8}" for k in args.k) + f"{'p50 ms':>10}{'p95 ms':>10}"
+        print(f"\n{len(queries)} queries, {len(vectorstore.index_to_docstore_id)} chunks\n")
+        print(header)
+        print("-" * len(header))
+        for name, options in modes:
+            mode = "hybrid" if name.startswith("hybrid") else name
+            retriever = HybridRetriever(vectorstore, bm25, k=max_k, candidates=max(20, max_k), mode=mode, **options)
+            retriever.get_relevant_documents(queries[0]["query"])  # warm up model / caches
+            recall, latencies = evaluate(retriever, queries, args.k)
+            print(
+                f"{name:<15}"
+                + "".join(f"{recall[k]:>8.2f}" for k in args.k)
+                + f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}"
+            )
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
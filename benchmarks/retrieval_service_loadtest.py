@@ -0,0 +1,210 @@
+"""Load test for the retrieval service: throughput as the number of app workers grows.
+
+Usage:
+    python benchmarks/retrieval_service_loadtest.py [--workers 1 2 4 8] [--concurrency 4] [--duration 20]
+    python benchmarks/retrieval_service_loadtest.py --url http://127.0.0.1:8765 --tenants 0
+
+The bundled PDF is ingested once and copied to --tenants user indexes, then a retrieval
+service is started on them (unless --url points at a running one). For each worker count,
+that many client processes (standing in for Streamlit workers) each run --concurrency
+threads issuing searches for random tenants through the pooled RetrievalServiceClient.
+Reported per worker count: QPS, latency percentiles, errors, and the service's RSS.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from legal.utils import percentile  # noqa: E402
+from retrieval_eval import DEFAULT_PDF, DEFAULT_QUERIES  # noqa: E402
+
+
+def build_tenants(pdf_path, work_dir, tenants):
+    from legal.vectorstore import ingest_directory
+
+    vector_db_dir = os.path.join(work_dir, "vector_db_dir")
+    source_dir = os.path.join(work_dir, "data")
+    os.makedirs(source_dir, exist_ok=True)
+    shutil.copy(pdf_path, source_dir)
+    first = os.path.join(vector_db_dir, "tenant-0")
+    started = time.perf_counter()
+    success, message = ingest_directory(source_dir, first)
+    if not success:
+        raise SystemExit(message)
+    for i in range(1, tenants):
+        shutil.copytree(first, os.path.join(vector_db_dir, f"tenant-{i}"))
+    print(f"Built {tenants} tenant indexes in {time.perf_counter() - started:.1f}s")
+    return vector_db_dir
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(vector_db_dir, idle_ttl):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "legal.retrieval_service", "--vector-db-dir", vector_db_dir,
+         "--port", str(port), "--idle-ttl", str(idle_ttl)],
+        cwd=ROOT
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 300  # first start downloads/loads the embedding model
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Retrieval service exited during startup")
+        try:
+            urllib.request.urlopen(url + "/health", timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("Retrieval service did not come up")
+
+
+def service_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def client_worker(url, queries, tenants, concurrency, duration, k, seed, results):
+    """One simulated app worker: `concurrency` threads sharing one pooled client"""
+    from legal.vectorstore import RetrievalServiceClient
+
+    client = RetrievalServiceClient(url, pool_size=concurrency)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def run(thread_index):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + thread_index)
+        while time.perf_counter() < deadline:
+            user_id = f"tenant-{rng.randrange(tenants)}" if tenants else None
+            started = time.perf_counter()
+            try:
+                client.search(user_id, rng.choice(queries), k=k)
+                elapsed = 1000 * (time.perf_counter() - started)
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors += 1
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put({"latencies": latencies, "errors": errors})
+
+
+def run_level(url, queries, workers, args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=client_worker,
+            args=(url, queries, args.tenants, args.concurrency, args.duration, args.k, seed, results)
+        )
+        for seed in range(workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    wall = time.perf_counter() - started
+    latencies = [latency for result in collected for latency in result["latencies"]]
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "qps": len(latencies) / min(wall, args.duration) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "errors": sum(result["errors"] for result in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--url", help="use an already running service instead of starting one")
+    parser.add_argument("--tenants", type=int, default=8, help="user indexes to spread queries over (0 = the vector_db_dir root index)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=4, help="threads per worker process")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per worker count")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--idle-ttl", type=float, default=600.0)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+
+    work_dir = None
+    service = None
+    url = args.url
+    try:
+        if url is None:
+            work_dir = tempfile.mkdtemp(prefix="retrieval_service_loadtest_")
+            os.environ["PDF_PAGE_CACHE"] = os.path.join(work_dir, "pdf_pages.sqlite3")  # built cold, like a fresh tenant
+            vector_db_dir = build_tenants(args.pdf, work_dir, max(args.tenants, 1))
+            service, url = start_service(vector_db_dir, args.idle_ttl)
+
+        header = (
+            f"{'workers':>8}{'requests':>10}{'QPS':>9}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'errors':>8}{'svc RSS MB':>12}"
+        )
+        print(f"\n{args.concurrency} threads per worker, {args.duration:.0f}s per level, {args.tenants} tenants\n")
+        print(header)
+        print("-" * len(header))
+        base_qps = None
+        for workers in args.workers:
+            level = run_level(url, queries, workers, args)
+            base_qps = base_qps or level["qps"] or None
+            speedup = level["qps"] / base_qps if base_qps else 0.0
+            rss = service_rss_mb(service.pid) if service else float("nan")
+            print(
+                f"{workers:>8}{level['requests']:>10}{level['qps']:>9.1f}{speedup:>8.2f}x{level['p50_ms']:>9.1f}"
+                f"{level['p95_ms']:>9.1f}{level['p99_ms']:>9.1f}{level['errors']:>8}{rss:>12.0f}"
+            )
+        health = json.loads(urllib.request.urlopen(url + "/health", timeout=5).read())
+        embedding = health["embedding"]
+        print(
+            f"\nservice: {len(health['cached_indexes'])} indexes cached, "
+            f"avg embedding batch {embedding['avg_batch_size']:.1f} texts"
+        )
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
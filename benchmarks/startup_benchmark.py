@@ -0,0 +1,132 @@
+"""Cold-start cost of the app's imports and of each lazily loaded heavy component.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--top 15] [--check]
+
+Every measurement runs in a fresh interpreter so nothing is already in sys.modules.
+Reported:
+  * import time of each module main.py imports, and of all of them together (median of --runs)
+  * which heavy stacks those imports dragged in (FAISS, torch, Unstructured, the Gemini SDK);
+    with --check the script exits non-zero if any of them is loaded at import time
+  * the slowest imports from `python -X importtime` for the app import set
+  * first-use cost of each component in legal/warmup.py, i.e. what the background
+    warm-up takes off the first question's latency
+GEMINI_BACKEND defaults to stub here so no API key is needed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules main.py imports before its first render, in the same order
+APP_MODULES = [
+    "streamlit",
+    "ui.chat",
+    "ui.faq",
+    "legal.vectorstore",
+    "legal.jobs",
+    "legal.tracing",
+    "legal.warmup",
+    "legal.gemini",
+    "legal.context",
+    "legal.memory",
+    "legal.utils",
+]
+HEAVY_MODULES = ["faiss", "torch", "sentence_transformers", "unstructured", "google.generativeai", "langchain_community"]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_WARMUP_SNIPPET = """
+import json
+from legal.warmup import warm_up, warmup_status
+warm_up({components!r})
+print(json.dumps(warmup_status()))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("GEMINI_BACKEND", "stub")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _run_python(code, extra_args=()):
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=ROOT, env=_env(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Subprocess failed:\n{result.stderr[-2000:]}")
+    return result
+
+
+def time_imports(modules, runs):
+    samples, heavy = [], []
+    for _ in range(runs):
+        result = _run_python(_IMPORT_SNIPPET.format(modules=modules, heavy=HEAVY_MODULES))
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(data["seconds"])
+        heavy = data["heavy"]
+    return statistics.median(samples), heavy
+
+
+def slowest_imports(modules, top):
+    """Parse `-X importtime` output: (cumulative microseconds, module) for the slowest imports"""
+    result = _run_python("\n".join(f"import {name}" for name in modules), extra_args=("-X", "importtime"))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--components", nargs="+", default=["faiss", "embeddings", "gemini", "unstructured"])
+    parser.add_argument("--check", action="store_true", help="fail if a heavy stack is imported at app start")
+    args = parser.parse_args()
+
+    print(f"{'module':<22}{'import ms':>12}")
+    print("-" * 34)
+    for name in APP_MODULES:
+        seconds, _ = time_imports([name], args.runs)
+        print(f"{name:<22}{1000 * seconds:>12.0f}")
+    total, heavy = time_imports(APP_MODULES, args.runs)
+    print("-" * 34)
+    print(f"{'all app imports':<22}{1000 * total:>12.0f}")
+    print(f"\nheavy stacks loaded at import: {', '.join(heavy) if heavy else 'none'}")
+
+    print("\nslowest imports (cumulative, -X importtime):")
+    for cumulative_us, name in slowest_imports(APP_MODULES, args.top):
+        print(f"  {cumulative_us / 1000:>9.0f} ms  {name}")
+
+    print("\nfirst-use cost of lazily loaded components (fresh process):")
+    status = json.loads(_run_python(_WARMUP_SNIPPET.format(components=args.components)).stdout.strip().splitlines()[-1])
+    for name in args.components:
+        entry = status.get(name, {})
+        detail = f"failed: {entry['error']}" if entry.get("state") == "failed" else f"{entry.get('seconds', 0.0):.2f} s"
+        print(f"  {name:<14}{detail}")
+
+    if args.check and heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
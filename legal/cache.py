@@ -0,0 +1,150 @@
+# Response cache for Gemini answers: in-memory LRU tier plus an optional SQLite tier.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+def make_cache_key(
+    prompt: str,
+    context: Optional[str],
+    model: str,
+    temperature: float,
+    history: Optional[str] = None
+) -> str:
+    """Key on the normalized prompt, a fingerprint of the retrieved context (and conversation
+    history, when sent), the model and temperature"""
+    fingerprint = (context or "") + (f"\x1e{history}" if history else "")
+    context_hash = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([normalize_prompt(prompt), context_hash, model, f"{temperature:.3f}"])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Tiers store (value, expires_at) so an entry promoted from a slower tier keeps its
+# original expiry instead of starting a fresh TTL
+class MemoryTier:
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteTier:
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the tier safe to share across Streamlit threads
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+
+class ResponseCache:
+    """Read-through over the tiers in order; a hit in a slower tier is promoted to the faster ones"""
+
+    def __init__(self, tiers: List, ttl: float = 24 * 3600):
+        self.tiers = tiers
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = {tier.name: 0 for tier in tiers}
+        self._misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                for faster_tier in self.tiers[:i]:
+                    faster_tier.set(key, value, expires_at)
+                with self._lock:
+                    self._hits[tier.name] += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        for tier in self.tiers:
+            tier.set(key, value, expires_at)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + self._misses
+            return {
+                "hits": hits,
+                "misses": self._misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "hits_by_tier": dict(self._hits),
+            }
+
+
+def default_response_cache() -> ResponseCache:
+    """Memory tier always; SQLite tier when GEMINI_CACHE_DB points at a file"""
+    tiers = [MemoryTier(int(os.getenv("GEMINI_CACHE_SIZE", "1024")))]
+    db_path = os.getenv("GEMINI_CACHE_DB")
+    if db_path:
+        tiers.append(SQLiteTier(db_path))
+    return ResponseCache(tiers, ttl=float(os.getenv("GEMINI_CACHE_TTL", str(24 * 3600))))
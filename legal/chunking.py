@@ -0,0 +1,202 @@
+# Structure-aware splitter for Indian legal documents (acts, judgments, contracts).
+
+import re
+from typing import Iterable, List, Optional
+from langchain_core.documents import Document
+
+# Top-level divisions: "PART III", "CHAPTER IV", "THE FIRST SCHEDULE"
+_DIVISION_RE = re.compile(r"^\s*(?:THE\s+\w+\s+)?(PART|CHAPTER|SCHEDULE)\b\s*([IVXLC]+[A-Z]?|\d+[A-Z]?)?", re.IGNORECASE)
+# Explicit references: "Section 138.", "ARTICLE 21A", "Clause 4.2", "Rule 3", "Order XXI"
+_NAMED_RE = re.compile(r"^\s*(Section|Article|Clause|Rule|Order|Regulation)\s+(\d+[A-Z]{0,3}(?:\.\d+)*|[IVXLC]+)\b", re.IGNORECASE)
+# Numbered provisions / paragraphs: "21. Protection of life", "1[21A. Right to education", "12.3 Termination"
+_NUMBERED_RE = re.compile(r"^\s*(?:\d+\[)?(\d{1,3}[A-Z]{0,3}\.(?:\d+\.?)*)\s+[A-Z“\"(\[]")
+# Editorial footnotes: "1. Ins. by the Constitution (...) Act", "5. Subs. by s. 2, ibid.",
+# "3. The words \"...\" omitted by ..." — numbered like provisions, but not headings
+_FOOTNOTE_RE = re.compile(
+    r"^\s*(\d{1,3})\.\s+(?:[^.\n]{0,80}?\s)?"
+    r"(?:Ins|Subs|Rep|Omitted|Added|Inserted|Substituted|Renumbered|Repealed)\.?\s+(?:by|vide|w\.e\.f)\b",
+    re.IGNORECASE
+)
+# Sub-clauses: "(1)", "(a)", "(iv)", "(2A)"
+_CLAUSE_RE = re.compile(r"^\s*(?:\d+\[)?\((\d+[A-Z]?|[a-z]{1,2}|[ivxl]+)\)\s")
+_SENTENCE_END_RE = re.compile(r"(?<=[.;:?!])\s+")
+
+DIVISION, SECTION, CLAUSE, TEXT, FOOTNOTE = range(5)
+
+
+def classify_line(line: str):
+    """Return (kind, identifier) for one line of text"""
+    match = _FOOTNOTE_RE.match(line)
+    if match:
+        return FOOTNOTE, match.group(1)
+    match = _DIVISION_RE.match(line)
+    if match and line.strip().isupper():
+        return DIVISION, " ".join(part for part in match.groups() if part).upper()
+    match = _NAMED_RE.match(line)
+    if match:
+        return SECTION, f"{match.group(1).title()} {match.group(2)}"
+    match = _NUMBERED_RE.match(line)
+    if match:
+        return SECTION, match.group(1).rstrip(".")
+    match = _CLAUSE_RE.match(line)
+    if match:
+        return CLAUSE, match.group(1)
+    return TEXT, None
+
+
+class LegalTextSplitter:
+    """Split on divisions, sections and clause numbering in a single pass over each document.
+
+    Chunks never straddle a section heading unless the running chunk is still below
+    min_chunk_size (so short provisions are grouped rather than embedded alone).
+    Oversized sections break at clause boundaries first, then at sentence ends.
+    Heading-only or tiny fragments (under min_fragment_size, e.g. "PART V / THE UNION")
+    lead the next chunk instead of being emitted alone. Editorial footnotes ("1. Ins. by
+    ...") and the footnote block at the bottom of a page never start a section.
+    Each chunk records section_id, division, page_number and start_index (None for a
+    chunk that opens with a fragment carried over from the previous page).
+    Consecutive documents passed in one call (e.g. the pages of one file) share the
+    running section context, so a provision continuing onto the next page keeps its ID.
+    """
+
+    def __init__(self, chunk_size: int = 1500, min_chunk_size: int = 300, min_fragment_size: int = 100):
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.min_fragment_size = min_fragment_size
+        self.clause_break_size = int(chunk_size * 0.75)
+
+    def split_text(self, text: str) -> List[str]:
+        return [doc.page_content for doc in self.split_documents([Document(page_content=text)])]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        chunks: List[Document] = []
+        division: Optional[str] = None
+        section: Optional[str] = None
+        source = None
+        carry, carry_document = "", None
+        for document in documents:
+            if document.metadata.get("source") != source:
+                self._flush_carry(carry, carry_document, division, chunks)
+                carry = ""
+                source = document.metadata.get("source")
+                division, section = None, None
+            division, section, carry = self._split_one(document, division, section, chunks, carry)
+            carry_document = document
+        self._flush_carry(carry, carry_document, division, chunks)
+        return chunks
+
+    def _is_fragment(self, text: str) -> bool:
+        return len(text) < self.min_fragment_size or text.isupper()
+
+    def _make_chunk(self, text, document, section_id, sections, division, start):
+        metadata = dict(document.metadata)
+        metadata.update({
+            "section_id": section_id,
+            "section_ids": ",".join(sections),
+            "division": division or "",
+            "start_index": start,
+        })
+        return Document(page_content=text, metadata=metadata)
+
+    def _flush_carry(self, carry, document, division, chunks):
+        """A fragment left at the end of a file joins that file's last chunk"""
+        text = carry.strip()
+        if not text:
+            return
+        if chunks and chunks[-1].metadata.get("source") == document.metadata.get("source"):
+            chunks[-1].page_content += "\n" + text
+        else:
+            chunks.append(self._make_chunk(text, document, "", [], division, 0))
+
+    def _split_one(self, document, division, section, chunks, carry=""):
+        lines: List[str] = [carry] if carry else []
+        length = len(carry)
+        # A fragment carried over from the previous page has no offset on this one
+        start = None if carry else 0
+        chunk_section = section
+        sections = []
+        offset = 0
+        footnote = None  # number of the last footnote line; set while inside a footnote block
+
+        def flush(force=True):
+            """Emit the running chunk; without force, a fragment is kept to lead the next one"""
+            nonlocal lines, length, sections, chunk_section
+            text = "".join(lines).strip()
+            if not force and text and self._is_fragment(text):
+                chunk_section = None  # the next chunk takes its ID from its first section
+                return
+            if text:
+                section_id = chunk_section or (sections[0] if sections else "")
+                chunks.append(self._make_chunk(text, document, section_id, sections, division, start))
+            lines, length, sections = [], 0, []
+
+        for line in document.page_content.splitlines(keepends=True):
+            kind, identifier = classify_line(line)
+            if kind == SECTION and footnote is not None and identifier == str(int(footnote) + 1):
+                kind = FOOTNOTE  # the next entry of a footnote block, e.g. "2. Cl. (3) renumbered as ..."
+            if kind == FOOTNOTE:
+                footnote = identifier
+            elif kind in (DIVISION, SECTION):
+                footnote = None
+
+            if kind == DIVISION:
+                if lines:
+                    flush(force=False)
+                division, section = identifier, None
+            elif kind == SECTION:
+                if lines and length + len(line) > self.chunk_size:
+                    flush()
+                elif lines and length >= self.min_chunk_size:
+                    flush(force=False)
+                section = identifier
+            elif kind == CLAUSE and length >= self.clause_break_size:
+                # Long section: break at clause numbering before it overflows
+                flush()
+            elif lines and length + len(line) > self.chunk_size:
+                flush()
+
+            if not lines:
+                start = offset
+                chunk_section = section
+            if section and section not in sections:
+                sections.append(section)
+
+            if len(line) > self.chunk_size:
+                # A single line longer than a chunk: fall back to sentence boundaries
+                for piece in self._split_long_line(line):
+                    if lines and length + len(piece) > self.chunk_size:
+                        flush()
+                        start = offset
+                        chunk_section = section
+                        if section:
+                            sections.append(section)
+                    lines.append(piece)
+                    length += len(piece)
+                    offset += len(piece)
+                continue
+
+            lines.append(line)
+            length += len(line)
+            offset += len(line)
+
+        if lines:
+            flush(force=False)
+        # Whatever flush kept is a fragment: it leads the next page's first chunk
+        return division, section, "".join(lines)
+
+    def _split_long_line(self, line: str) -> List[str]:
+        pieces = []
+        piece_start = 0
+        last_break = 0
+        for end in [m.end() for m in _SENTENCE_END_RE.finditer(line)] + [len(line)]:
+            if end - piece_start > self.chunk_size and last_break > piece_start:
+                pieces.append(line[piece_start:last_break])
+                piece_start = last_break
+            while end - piece_start > self.chunk_size:
+                # A single sentence longer than a chunk gets a hard cut
+                pieces.append(line[piece_start:piece_start + self.chunk_size])
+                piece_start += self.chunk_size
+            last_break = end
+        if piece_start < len(line):
+            pieces.append(line[piece_start:])
+        return pieces
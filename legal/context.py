@@ -0,0 +1,126 @@
+# Context packing: dedupe and merge retrieved chunks, then fill a token budget by relevance.
+
+import re
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from legal.ratelimit import estimate_tokens
+
+MIN_OVERLAP_CHARS = 20
+
+
+class _Block:
+    def __init__(self, document: Document):
+        self.corpus = document.metadata.get("corpus")  # "private" / "shared" when both were searched
+        self.source = document.metadata.get("source")
+        self.page = document.metadata.get("page_number", document.metadata.get("page"))
+        self.text = document.page_content
+        self.start = document.metadata.get("start_index")
+        self.score = document.metadata.get("score", 0.0)
+        self.chunks = 1
+
+    @property
+    def end(self):
+        return self.start + len(self.text) if self.start is not None else None
+
+
+def _text_overlap(left: str, right: str, max_overlap: int = 600) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    for size in range(min(len(left), len(right), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _try_merge(a: _Block, b: _Block) -> Optional[str]:
+    """Merged text if a and b are duplicate, overlapping or adjacent pieces of one page"""
+    if (a.corpus, a.source, a.page) != (b.corpus, b.source, b.page):
+        return None
+    if b.text in a.text:
+        return a.text
+    if a.text in b.text:
+        return b.text
+    if a.start is not None and b.start is not None:
+        first, second = (a, b) if a.start <= b.start else (b, a)
+        overlap = first.end - second.start
+        if -1 <= overlap <= 0:
+            return first.text + second.text  # adjacent
+        # Offsets are only a shortcut: the text itself must agree, or nothing is cut
+        if overlap > 0 and first.text.endswith(second.text[:overlap]):
+            return first.text + second.text[overlap:]
+    overlap = _text_overlap(a.text, b.text)
+    if overlap:
+        return a.text + b.text[overlap:]
+    overlap = _text_overlap(b.text, a.text)
+    if overlap:
+        return b.text + a.text[overlap:]
+    return None
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut at the last sentence boundary that fits, never mid-sentence"""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    boundaries = [m.end() for m in re.finditer(r"[.;:?!](\s|$)|\n\n", head)]
+    return head[:boundaries[-1]].rstrip() if boundaries else ""
+
+
+def pack_context(documents: List[Document], token_budget: int = 6000) -> Tuple[Optional[str], dict]:
+    """Build the prompt context from retrieved documents.
+
+    Returns (context, stats); context is None when nothing fits. Stats carry the packed
+    token count and the (source, page) of every excerpt for citation.
+    """
+    blocks: List[_Block] = []
+    duplicates = 0
+    for document in sorted(documents, key=lambda doc: doc.metadata.get("score", 0.0), reverse=True):
+        block = _Block(document)
+        for existing in blocks:
+            merged = _try_merge(existing, block)
+            if merged is None:
+                continue
+            if merged == existing.text:
+                duplicates += 1
+            if block.start is not None and existing.start is not None:
+                existing.start = min(existing.start, block.start)
+            existing.text = merged
+            existing.score = max(existing.score, block.score)
+            existing.chunks += 1
+            break
+        else:
+            blocks.append(block)
+
+    excerpts = []
+    packed_tokens = 0
+    for block in blocks:
+        remaining = token_budget - packed_tokens
+        if remaining <= 0:
+            break
+        text = block.text.strip()
+        if estimate_tokens(text) > remaining:
+            text = _truncate_to_tokens(text, remaining)
+            if not text:
+                continue
+        packed_tokens += estimate_tokens(text)
+        excerpts.append((block, text))
+
+    stats = {
+        "budget_tokens": token_budget,
+        "packed_tokens": packed_tokens,
+        "chunks_in": len(documents),
+        "excerpts": len(excerpts),
+        "duplicates_dropped": duplicates,
+        "citations": [(block.source, block.page) for block, _ in excerpts],
+    }
+    if not excerpts:
+        return None, stats
+
+    sections = []
+    for i, (block, text) in enumerate(excerpts):
+        label = ", ".join(str(part) for part in (
+            block.source,
+            f"page {block.page}" if block.page is not None else None
+        ) if part)
+        sections.append(f"📄 Document Excerpt {i+1}" + (f" ({label})" if label else "") + f":\n{text}")
+    return "\n\n".join(sections), stats
@@ -0,0 +1,182 @@
+# Shared embedding engine: one model per process, micro-batched across sessions.
+
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+QUERY_PRIORITY, DOCUMENT_PRIORITY = 0, 1
+
+
+class _EmbedRequest:
+    def __init__(self, texts: List[str], priority: int = DOCUMENT_PRIORITY):
+        self.texts = texts
+        self.priority = priority
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.vectors: Optional[List[List[float]]] = None
+        self.error: Optional[BaseException] = None
+
+
+class EmbeddingEngine(Embeddings):
+    """Process-wide embedding model that coalesces concurrent requests into one forward pass.
+
+    Large requests are queued as max_batch_size slices and query embeddings jump ahead
+    of document slices, so an ingestion run never holds interactive queries behind it.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, max_batch_size: int = 64, max_wait_ms: float = 10):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._model = None
+        self._model_lock = threading.Lock()
+        # (priority, sequence, request): FIFO within a priority level
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started_at = time.time()
+        self._requests = 0
+        self._texts = 0
+        self._batches = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    # --- Model / worker lifecycle ---
+    def _get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="embedding-engine", daemon=True)
+                    self._worker.start()
+
+    def warm_up(self):
+        """Load the model ahead of the first request"""
+        self._get_model()
+        self._ensure_worker()
+
+    # --- Micro-batching loop ---
+    def _put(self, request: _EmbedRequest):
+        self._queue.put((request.priority, next(self._sequence), request))
+
+    def _collect_batch(self) -> List[_EmbedRequest]:
+        _, _, request = self._queue.get()
+        batch = [request]
+        size = len(request.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                priority, sequence, request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request.texts) > self.max_batch_size:
+                # Doesn't fit: back in the queue with its original place in line
+                self._queue.put((priority, sequence, request))
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self._get_model().embed_documents(texts)
+            except BaseException as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            finished_at = time.perf_counter()
+            offset = 0
+            for request in batch:
+                request.vectors = vectors[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                self._record(request, finished_at)
+                request.done.set()
+            with self._stats_lock:
+                self._batches += 1
+
+    def _record(self, request: _EmbedRequest, finished_at: float):
+        latency = finished_at - request.submitted_at
+        with self._stats_lock:
+            self._requests += 1
+            self._texts += len(request.texts)
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+
+    def _submit(self, texts: List[str], priority: int = DOCUMENT_PRIORITY) -> List[List[float]]:
+        if not texts:
+            return []
+        self._ensure_worker()
+        # One slice per forward pass at most; other callers' requests can run in between
+        requests = [
+            _EmbedRequest(texts[start:start + self.max_batch_size], priority)
+            for start in range(0, len(texts), self.max_batch_size)
+        ]
+        for request in requests:
+            self._put(request)
+        vectors = []
+        for request in requests:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            vectors.extend(request.vectors)
+        return vectors
+
+    # --- Embeddings interface ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._submit(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit([text], priority=QUERY_PRIORITY)[0]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            elapsed = max(time.time() - self._started_at, 1e-9)
+            return {
+                "requests": self._requests,
+                "texts": self._texts,
+                "batches": self._batches,
+                "avg_batch_size": self._texts / self._batches if self._batches else 0.0,
+                "avg_latency_ms": 1000 * self._latency_total / self._requests if self._requests else 0.0,
+                "max_latency_ms": 1000 * self._latency_max,
+                "texts_per_second": self._texts / elapsed,
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+# --- Singleton accessor ---
+_engine: Optional[EmbeddingEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmbeddingEngine(
+                    model_name=os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL),
+                    max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64")),
+                    max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+                )
+    return _engine
@@ -1,78 +1,552 @@
+import asyncio
+import contextvars
 import os
+import queue
+import random
+import threading
 import time
-from typing import Optional
-import google.generativeai as genai
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional
 from dotenv import load_dotenv
+from legal.cache import ResponseCache, default_response_cache, make_cache_key
+from legal.ratelimit import RateLimitTimeout, TokenBucketLimiter, estimate_tokens, get_rate_limiter
+from legal.routing import ModelRouter, default_model_router, is_quota_error
+from legal.tracing import get_tracer
 
 # --- Load .env and configure API ---
+# GEMINI_BACKEND=stub swaps Gemini for the deterministic local model in legal/gemini_stub.py
 load_dotenv()
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "gemini")
 api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+if GEMINI_BACKEND != "stub" and not api_key:
     raise ValueError("❌ GEMINI_API_KEY not found in environment variables.")
 
-genai.configure(api_key=api_key)
+
+# --- Model handle cache ---
+# GenerativeModel objects share the SDK's underlying client, so reusing them keeps
+# connections warm instead of rebuilding a handle on every attempt. The SDK itself
+# (grpc, protobuf) is only imported and configured when the first handle is built.
+_model_handles = {}
+_model_handles_lock = threading.Lock()
+
+
+def _new_model(model_name: str):
+    if GEMINI_BACKEND == "stub":
+        from legal.gemini_stub import stub_model_from_env
+        return stub_model_from_env(model_name)
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+def _get_model(model_name: str):
+    model = _model_handles.get(model_name)
+    if model is None:
+        with _model_handles_lock:
+            model = _model_handles.get(model_name)
+            if model is None:
+                model = _model_handles[model_name] = _new_model(model_name)
+    return model
+
+
+# Set for calls that must yield to interactive traffic (memory summaries); copied into pool
+# threads with the rest of the context, like the request trace
+_background_call = contextvars.ContextVar("gemini_background_call", default=False)
+
+
+# --- Shared event loop ---
+# The SDK's async client binds to the event loop it was first used on, so every coroutine
+# runs on one long-lived loop in a daemon thread instead of a fresh asyncio.run() per call.
+_async_loop = None
+_async_loop_lock = threading.Lock()
+
+
+def _get_async_loop():
+    global _async_loop
+    if _async_loop is None:
+        with _async_loop_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-async", daemon=True).start()
+                _async_loop = loop
+    return _async_loop
+
+
+def run_async(coro):
+    """Run a coroutine on the shared loop from synchronous code and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_async_loop()).result()
 
 
 # --- GeminiChat Class Definition ---
 class GeminiChat:
-    def __init__(self, api_key: str, default_model: str = "gemini-1.5-flash", max_retries: int = 3):
+    def __init__(
+        self,
+        api_key: str,
+        default_model: str = DEFAULT_MODEL,
+        max_retries: int = 3,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[TokenBucketLimiter] = None,
+        router: Optional[ModelRouter] = None
+    ):
         self.api_key = api_key
         self.default_model = default_model
         self.max_retries = max_retries
         self.retry_delay = 2
-        self.last_prompt = None
-        self.last_response = None
+        self.max_retry_delay = 30
+        self.cache = cache
+        self.limiter = limiter or get_rate_limiter()
+        self.last_model = None
+        self.router = router or ModelRouter(default_model, hedge=False)
+        self.background_headroom = float(os.getenv("GEMINI_BACKGROUND_HEADROOM", "0.5"))
+        self.background_max_wait = float(os.getenv("GEMINI_BACKGROUND_MAX_WAIT", "60"))
+        # Runs hedged calls and stream producers; abandoned hedges finish here in the background
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("GEMINI_CALL_WORKERS", "32")),
+            thread_name_prefix="gemini-call"
+        )
+        self.tracer = get_tracer()
+
+    def _rate_limit(self, full_prompt: str):
+        # Waits only when the shared RPM/TPM budget is actually exhausted; background calls
+        # also wait while the budget is below background_headroom
+        if _background_call.get():
+            delay = self.limiter.wait_background(
+                estimate_tokens(full_prompt), self.background_headroom, max_wait=self.background_max_wait
+            )
+        else:
+            delay = self.limiter.wait(estimate_tokens(full_prompt))
+        self.tracer.record("gemini.rate_limit_wait", 1000 * delay)
+
+    async def _rate_limit_async(self, full_prompt: str):
+        delay = await self.limiter.wait_async(estimate_tokens(full_prompt))
+        self.tracer.record("gemini.rate_limit_wait", 1000 * delay)
+
+    def _cache_lookup(self, key: Optional[str]) -> Optional[str]:
+        if not key:
+            return None
+        cached = self.cache.get(key)
+        self.tracer.incr("response_cache", result="hit" if cached is not None else "miss")
+        return cached
 
-    def _rate_limit(self):
-        time.sleep(1)  # Basic rate-limiting to avoid overloading the API
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Exponential backoff with full jitter; quota errors start from a longer base"""
+        base = self.retry_delay * (2 if is_quota_error(error) else 1)
+        return random.uniform(0, min(self.max_retry_delay, base * 2 ** attempt))
 
-    def _build_prompt(self, prompt: str, context: Optional[str] = None) -> str:
-        if context:
-            return f"Context:\n{context}\n\nQuestion: {prompt}"
-        return prompt
+    def _build_prompt(self, prompt: str, context: Optional[str] = None, history: Optional[str] = None) -> str:
+        with self.tracer.span("gemini.build_prompt"):
+            sections = []
+            if history:
+                sections.append(f"Conversation so far:\n{history}")
+            if context:
+                sections.append(f"Context:\n{context}")
+            if not sections:
+                return prompt
+            return "\n\n".join(sections) + f"\n\nQuestion: {prompt}"
 
     def _format_response(self, text: str) -> str:
         return text.strip()
 
-    def _summarize_response(self, text: str) -> str:
-        summary_lines = text.split("\n")[:5]
-        return "\n".join(summary_lines) + "\n\n📌 Ask a follow-up for more details."
+    def _submit(self, fn, *args):
+        # Copy the context so spans from the worker thread land in the caller's request trace
+        return self._pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def _attempt_plan(self, decision: dict) -> List[str]:
+        """max_retries attempts spread over the routed candidates, cycling if there are fewer"""
+        candidates = decision["candidates"]
+        return [candidates[i % len(candidates)] for i in range(max(self.max_retries, 1))]
+
+    def _call_once(self, full_prompt: str, model_to_use: str, temperature: float) -> str:
+        self._rate_limit(full_prompt)
+        started = time.perf_counter()
+        try:
+            with self.tracer.span("gemini.call", model=model_to_use):
+                response = _get_model(model_to_use).generate_content(
+                    full_prompt,
+                    generation_config={"temperature": temperature}
+                )
+            text = self._format_response(response.text)
+        except Exception as e:
+            self.router.record(model_to_use, error=e)
+            raise
+        self.router.record(model_to_use, 1000 * (time.perf_counter() - started))
+        return text
+
+    def _race(self, full_prompt: str, models: List[str], delay: Optional[float], temperature: float):
+        """Call models[0]; if it hasn't answered after `delay` seconds, start models[1] as well.
+
+        Returns (winner, text, models started, last error). A blocking SDK call can't be
+        cancelled, so the slower one runs to completion in the pool and only feeds the stats.
+        """
+        if delay is None or len(models) < 2:
+            try:
+                return models[0], self._call_once(full_prompt, models[0], temperature), models[:1], None
+            except Exception as e:
+                return None, None, models[:1], e
+        futures = {self._submit(self._call_once, full_prompt, models[0], temperature): models[0]}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures[self._submit(self._call_once, full_prompt, models[1], temperature)] = models[1]
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return futures[future], future.result(), list(futures.values()), None
+                except Exception as e:
+                    error = e
+        return None, None, list(futures.values()), error
+
+    def _call_routed(self, full_prompt: str, temperature: float, decision: dict) -> str:
+        plan = self._attempt_plan(decision)
+        started = time.perf_counter()
+        attempt, error = 0, None
+        while attempt < len(plan):
+            model_to_use = plan[attempt]
+            if model_to_use in plan[:attempt]:
+                time.sleep(self._backoff_delay(attempt - 1, error))
+            # Only the first attempt is hedged (and never a background call); later ones are already a failover
+            hedge = attempt == 0 and len(plan) > 1 and plan[1] != plan[0] and not _background_call.get()
+            models = plan[:2] if hedge else [model_to_use]
+            delay = self.router.hedge_delay(model_to_use) if len(models) > 1 else None
+            winner, text, tried, error = self._race(full_prompt, models, delay, temperature)
+            decision["hedged"] = decision["hedged"] or len(tried) > 1
+            if isinstance(error, RateLimitTimeout):
+                break  # a background call found no spare budget; another attempt would only wait again
+            if winner:
+                if not _background_call.get():
+                    self.last_model = winner  # the model shown in the UI answers user queries only
+                self.router.finish(decision, winner, 1000 * (time.perf_counter() - started))
+                return text
+            attempt += len(tried)
+            if attempt < len(plan):
+                self.tracer.incr("gemini_retries", model=model_to_use, quota=is_quota_error(error))
+        self.tracer.incr("gemini_failures", model=plan[-1])
+        self.router.finish(decision, None, 1000 * (time.perf_counter() - started), error)
+        raise error
+
+    async def _call_routed_async(self, full_prompt: str, temperature: float, decision: dict) -> str:
+        """Async twin of _call_routed for batch prewarming: fails over, but never hedges"""
+        plan = self._attempt_plan(decision)
+        started = time.perf_counter()
+        error = None
+        for attempt, model_to_use in enumerate(plan):
+            if model_to_use in plan[:attempt]:
+                await asyncio.sleep(self._backoff_delay(attempt - 1, error))
+            await self._rate_limit_async(full_prompt)
+            call_started = time.perf_counter()
+            try:
+                with self.tracer.span("gemini.call", model=model_to_use):
+                    response = await _get_model(model_to_use).generate_content_async(
+                        full_prompt,
+                        generation_config={"temperature": temperature}
+                    )
+                text = self._format_response(response.text)
+            except Exception as e:
+                error = e
+                self.router.record(model_to_use, error=e)
+                if attempt < len(plan) - 1:
+                    self.tracer.incr("gemini_retries", model=model_to_use, quota=is_quota_error(e))
+                continue
+            self.router.record(model_to_use, 1000 * (time.perf_counter() - call_started))
+            self.router.finish(decision, model_to_use, 1000 * (time.perf_counter() - started))
+            return text
+        self.tracer.incr("gemini_failures", model=plan[-1])
+        self.router.finish(decision, None, 1000 * (time.perf_counter() - started), error)
+        raise error
+
+    def _stream_once(
+        self,
+        full_prompt: str,
+        model_to_use: str,
+        temperature: float,
+        events: queue.Queue,
+        stop: threading.Event
+    ):
+        """Producer for _stream_routed: puts (model, kind, payload) events until done or stopped"""
+        try:
+            self._rate_limit(full_prompt)
+            started = time.perf_counter()
+            response = _get_model(model_to_use).generate_content(
+                full_prompt,
+                generation_config={"temperature": temperature},
+                stream=True
+            )
+            first = True
+            for chunk in response:
+                if stop.is_set():
+                    return
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # chunk carried no text (e.g. only safety metadata)
+                if first:
+                    first = False
+                    self.router.record(model_to_use, 1000 * (time.perf_counter() - started), kind="first_token")
+                events.put((model_to_use, "chunk", text))
+            events.put((model_to_use, "done", None))
+        except Exception as e:
+            self.router.record(model_to_use, error=e)
+            events.put((model_to_use, "error", e))
+
+    def _stream_routed(self, full_prompt: str, temperature: float, decision: dict) -> Iterator[str]:
+        """Stream the routed answer; a first token slower than the model's p95 starts a hedge.
+
+        Whichever stream produces text first wins and the other is abandoned. Failures
+        before the first token fail over to the next candidate; after it they are raised,
+        since a half-streamed answer can't be replayed on another model.
+        """
+        plan = self._attempt_plan(decision)
+        events = queue.Queue()
+        stops = {}
+        attempt, error, winner = 0, None, None
+
+        def launch(model_to_use: str):
+            stops[model_to_use] = threading.Event()
+            self._submit(self._stream_once, full_prompt, model_to_use, temperature, events, stops[model_to_use])
+
+        with self.tracer.span("gemini.stream", reason=decision["reason"]) as span:
+            try:
+                while winner is None and attempt < len(plan):
+                    model_to_use = plan[attempt]
+                    if model_to_use in plan[:attempt]:
+                        time.sleep(self._backoff_delay(attempt - 1, error))
+                    hedge_with = plan[1] if attempt == 0 and len(plan) > 1 and plan[1] != plan[0] else None
+                    delay = self.router.hedge_delay(model_to_use, kind="first_token") if hedge_with else None
+                    launch(model_to_use)
+                    live = {model_to_use}
+                    attempt += 1
+                    while live:
+                        try:
+                            source, kind, payload = events.get(timeout=delay)
+                        except queue.Empty:
+                            launch(hedge_with)
+                            live.add(hedge_with)
+                            attempt += 1
+                            decision["hedged"] = True
+                            delay = None
+                            continue
+                        if source not in live:
+                            continue
+                        if kind == "error":
+                            live.discard(source)
+                            error = payload
+                            continue
+                        winner = source
+                        break
+                    if winner is None and attempt < len(plan):
+                        self.tracer.incr("gemini_retries", model=model_to_use, quota=is_quota_error(error))
+
+                if winner is None:
+                    self.tracer.incr("gemini_failures", model=plan[-1])
+                    self.router.finish(decision, None, 1000 * (time.perf_counter() - span.started), error)
+                    raise error
+                for model_to_use, stop in stops.items():
+                    if model_to_use != winner:
+                        stop.set()
+                self.last_model = winner
+                span.attrs["model"] = winner
+                self.tracer.record("gemini.first_token", 1000 * (time.perf_counter() - span.started), model=winner)
+
+                while kind != "done":
+                    if kind == "error":
+                        self.router.finish(decision, winner, 1000 * (time.perf_counter() - span.started), payload)
+                        raise payload
+                    yield payload
+                    source, kind, payload = events.get()
+                    while source != winner:
+                        source, kind, payload = events.get()
+                self.router.finish(decision, winner, 1000 * (time.perf_counter() - span.started))
+            finally:
+                for stop in stops.values():
+                    stop.set()
+
+    def _cached_generate(
+        self,
+        prompt: str,
+        context: Optional[str],
+        temperature: float,
+        model_name: Optional[str] = None,
+        history: Optional[str] = None,
+        hint: Optional[str] = None
+    ) -> str:
+        decision = self.router.route(prompt, context, model_name, hint)
+        key = make_cache_key(prompt, context, decision["candidates"][0], temperature, history) if self.cache else None
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+
+        formatted_response = self._call_routed(self._build_prompt(prompt, context, history), temperature, decision)
+        if key:
+            self.cache.set(key, formatted_response)
+        return formatted_response
+
+    async def _cached_generate_async(
+        self,
+        prompt: str,
+        context: Optional[str],
+        temperature: float,
+        model_name: Optional[str] = None,
+        hint: Optional[str] = None
+    ) -> str:
+        decision = self.router.route(prompt, context, model_name, hint)
+        key = make_cache_key(prompt, context, decision["candidates"][0], temperature) if self.cache else None
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+
+        formatted_response = await self._call_routed_async(self._build_prompt(prompt, context), temperature, decision)
+        if key:
+            self.cache.set(key, formatted_response)
+        return formatted_response
 
     def generate_response(
         self,
         prompt: str,
         context: Optional[str] = None,
         temperature: float = 0.3,
-        model_name: Optional[str] = None
+        model_name: Optional[str] = None,
+        history: Optional[str] = None,
+        hint: Optional[str] = None
     ) -> str:
-        self._rate_limit()
+        """Answer a question; model_name pins the first model, hint="faq" prefers the fast one.
 
-        if prompt.strip().lower() == (self.last_prompt or "").strip().lower():
-            return f"🔁 You've already asked this. Here's a brief recap:\n\n{self._summarize_response(self.last_response)}"
+        This instance is shared by every session, so it keeps no per-question state: a
+        repeated question is answered from the response cache.
+        """
+        try:
+            return self._cached_generate(prompt, context, temperature, model_name, history, hint)
+        except Exception as e:
+            return f"❌ Failed to generate response after {self.max_retries} attempts.\n\nError: {str(e)}"
 
-        model_to_use = model_name or self.default_model
-        full_prompt = self._build_prompt(prompt, context)
+    def stream_response(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        temperature: float = 0.3,
+        model_name: Optional[str] = None,
+        history: Optional[str] = None,
+        hint: Optional[str] = None
+    ) -> Iterator[str]:
+        """Like generate_response, but yields text chunks as Gemini produces them"""
+        decision = self.router.route(prompt, context, model_name, hint)
+        key = make_cache_key(prompt, context, decision["candidates"][0], temperature, history) if self.cache else None
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            yield cached
+            return
 
-        for attempt in range(self.max_retries):
-            try:
-                model = genai.GenerativeModel(model_to_use)
-                response = model.generate_content(full_prompt, generation_config={"temperature": temperature})
-                formatted_response = self._format_response(response.text)
+        parts = []
+        try:
+            for text in self._stream_routed(self._build_prompt(prompt, context, history), temperature, decision):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            yield f"\n\n❌ Failed to generate response after {self.max_retries} attempts.\n\nError: {str(e)}"
+            return
+
+        formatted_response = self._format_response("".join(parts))
+        if key:
+            self.cache.set(key, formatted_response)
+
+    def generate_text(
+        self,
+        prompt: str,
+        temperature: float = 0.2,
+        model_name: Optional[str] = None,
+        background: bool = False
+    ) -> str:
+        """One-off completion for internal tasks (e.g. summaries); raises instead of returning an error message.
 
-                self.last_prompt = prompt
-                self.last_response = formatted_response
+        background=True skips the response cache, never hedges and only spends rate-limit
+        budget that leaves background_headroom free for user queries; it raises
+        RateLimitTimeout if no such budget frees up within background_max_wait seconds.
+        """
+        if not background:
+            return self._cached_generate(prompt, None, temperature, model_name)
+        token = _background_call.set(True)
+        try:
+            decision = self.router.route(prompt, None, model_name, None)
+            return self._call_routed(prompt, temperature, decision)
+        finally:
+            _background_call.reset(token)
 
-                return formatted_response
+    async def agenerate_many(
+        self,
+        prompts: Iterable[str],
+        context: Optional[str] = None,
+        temperature: float = 0.3,
+        model_name: Optional[str] = None,
+        hint: Optional[str] = None
+    ) -> List[str]:
+        """Answer independent prompts concurrently; the shared limiter still paces the calls.
 
+        Await it on the shared loop (see run_async): cached model handles can't move between loops.
+        """
+        async def answer(prompt: str) -> str:
+            try:
+                return await self._cached_generate_async(prompt, context, temperature, model_name, hint)
             except Exception as e:
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                else:
-                    return f"❌ Failed to generate response after {self.max_retries} attempts.\n\nError: {str(e)}"
+                return f"❌ Failed to generate response after {self.max_retries} attempts.\n\nError: {str(e)}"
+
+        return await asyncio.gather(*(answer(prompt) for prompt in prompts))
+
+    def prewarm(
+        self,
+        prompts: Iterable[str],
+        temperature: float = 0.3,
+        model_name: Optional[str] = None,
+        hint: Optional[str] = None
+    ):
+        """Fill the response cache for static prompts (e.g. the FAQ)"""
+        if not self.cache:
+            return
+        # Failed answers are never cached, so a failed warm-up just means the first click pays for it
+        run_async(self.agenerate_many(prompts, temperature=temperature, model_name=model_name, hint=hint))
 
 
 # --- Singleton Instance + Functional Interface ---
-gemini_instance = GeminiChat(api_key=api_key)
+_gemini_instance: Optional[GeminiChat] = None
+_gemini_instance_lock = threading.Lock()
+
+
+def get_gemini() -> GeminiChat:
+    global _gemini_instance
+    if _gemini_instance is None:
+        with _gemini_instance_lock:
+            if _gemini_instance is None:
+                router = default_model_router(DEFAULT_MODEL)
+                _gemini_instance = GeminiChat(
+                    api_key=api_key,
+                    default_model=router.primary_model,
+                    cache=default_response_cache(),
+                    router=router
+                )
+    return _gemini_instance
+
+
+def warm_up_model(model_name: Optional[str] = None):
+    """Import the SDK and build the model handle before the first question needs it"""
+    _get_model(model_name or get_gemini().default_model)
+
+
+def gemini_chat(
+    prompt: str,
+    context: Optional[str] = None,
+    history: Optional[str] = None,
+    model_name: Optional[str] = None,
+    hint: Optional[str] = None
+) -> str:
+    return get_gemini().generate_response(prompt, context, model_name=model_name, history=history, hint=hint)
+
 
-def gemini_chat(prompt: str, context: Optional[str] = None) -> str:
-    return gemini_instance.generate_response(prompt, context)
+def gemini_chat_stream(
+    prompt: str,
+    context: Optional[str] = None,
+    history: Optional[str] = None,
+    model_name: Optional[str] = None,
+    hint: Optional[str] = None
+) -> Iterator[str]:
+    return get_gemini().stream_response(prompt, context, model_name=model_name, history=history, hint=hint)
@@ -0,0 +1,88 @@
+# Deterministic local stand-in for genai.GenerativeModel, used by benchmarks and offline runs.
+
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Answers every prompt with text derived from its hash after a simulated round trip.
+
+    latency_ms is the mean round trip (uniform ±jitter); failure_rate is the share of calls
+    that raise a quota-style error, so the retry and fallback paths get exercised too.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        latency_ms: float = 300,
+        jitter: float = 0.5,
+        failure_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            delay = self.latency_ms * (1 + self.jitter * (2 * self._rng.random() - 1)) / 1000
+            failed = self._rng.random() < self.failure_rate
+        return max(0.0, delay), failed
+
+    def _answer(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        question = prompt.rsplit("Question:", 1)[-1].strip()[:200]
+        return (
+            f"[{self.model_name} stub {digest[:12]}] Regarding: {question}\n\n"
+            "1. The relevant provision is summarised from the supplied context.\n"
+            "2. Consult a qualified advocate before acting on this answer."
+        )
+
+    def generate_content(self, prompt: str, generation_config=None, stream: bool = False):
+        delay, failed = self._draw()
+        if failed:
+            time.sleep(delay / 4)
+            raise RuntimeError("429 Resource exhausted (stub)")
+        text = self._answer(prompt)
+        if not stream:
+            time.sleep(delay)
+            return StubResponse(text)
+        return self._stream(text, delay)
+
+    def _stream(self, text: str, delay: float):
+        # About a third of the round trip goes to the first token, the rest is spread over chunks
+        pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+        time.sleep(delay / 3)
+        for piece in pieces:
+            time.sleep(2 * delay / 3 / len(pieces))
+            yield StubResponse(piece)
+
+    async def generate_content_async(self, prompt: str, generation_config=None):
+        delay, failed = self._draw()
+        if failed:
+            await asyncio.sleep(delay / 4)
+            raise RuntimeError("429 Resource exhausted (stub)")
+        await asyncio.sleep(delay)
+        return StubResponse(self._answer(prompt))
+
+
+def stub_model_from_env(model_name: str) -> StubModel:
+    return StubModel(
+        model_name,
+        latency_ms=float(os.getenv("GEMINI_STUB_LATENCY_MS", "300")),
+        jitter=float(os.getenv("GEMINI_STUB_JITTER", "0.5")),
+        failure_rate=float(os.getenv("GEMINI_STUB_FAILURE_RATE", "0")),
+        seed=int(os.getenv("GEMINI_STUB_SEED", "0"))
+    )
@@ -0,0 +1,189 @@
+# Streaming ingestion pipeline: parse files in a process pool, chunk, and batch for embedding.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+
+
+def _load_pdf_unstructured(path):
+    from langchain_community.document_loaders import UnstructuredFileLoader
+    # "paged" keeps one Document per page so page numbers survive into chunk metadata
+    return UnstructuredFileLoader(path, mode="paged").load()
+
+
+def _load_pdf(path):
+    # Native text layer per page, OCR only for scanned pages, cached by file hash;
+    # the full Unstructured stack is only used when the fast path can't read the file
+    from legal.pdf_extract import default_page_cache, extract_pages
+    if os.getenv("PDF_TEXT_BACKEND") == "unstructured":
+        return _load_pdf_unstructured(path)
+    ocr = os.getenv("PDF_OCR", "1") != "0"
+    try:
+        pages = extract_pages(path, cache=default_page_cache(), ocr=ocr)
+    except Exception:
+        return _load_pdf_unstructured(path)  # no native extractor installed, or encrypted/corrupt PDF
+    documents = [
+        Document(page_content=page["text"], metadata={"page_number": page["page"], "extraction": page["method"]})
+        for page in pages
+        if page["text"].strip()
+    ]
+    if not documents:
+        # Raised so the file is reported as failed and retried, not recorded as ingested with no chunks
+        reason = "OCR is disabled (PDF_OCR=0)" if not ocr else "OCR is unavailable or found no text"
+        raise ValueError(f"No text could be extracted from {os.path.basename(path)}: it looks scanned and {reason}")
+    return documents
+
+
+def _load_docx(path):
+    from langchain_community.document_loaders import UnstructuredWordDocumentLoader
+    return UnstructuredWordDocumentLoader(path).load()
+
+
+def _load_txt(path):
+    from langchain_community.document_loaders import TextLoader
+    return TextLoader(path, autodetect_encoding=True).load()
+
+
+LOADERS = {
+    ".pdf": _load_pdf,
+    ".docx": _load_docx,
+    ".txt": _load_txt,
+}
+SUPPORTED_EXTENSIONS = set(LOADERS)
+
+
+def list_supported_files(root_dir, recursive=True) -> List[str]:
+    """Relative paths of every file under root_dir that has a loader"""
+    paths = []
+    for dirpath, _, filenames in os.walk(root_dir):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), root_dir))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def parse_file(root_dir, rel_path) -> Tuple[str, List[Document], Optional[str]]:
+    """Parse one file; runs inside a pool worker, so errors are returned rather than raised"""
+    loader = LOADERS.get(os.path.splitext(rel_path)[1].lower())
+    if loader is None:
+        return rel_path, [], f"Unsupported file type: {rel_path}"
+    try:
+        documents = loader(os.path.join(root_dir, rel_path))
+    except Exception as e:
+        return rel_path, [], str(e)
+    for document in documents:
+        document.metadata["source"] = rel_path
+    return rel_path, documents, None
+
+
+def default_parse_workers() -> int:
+    return min(os.cpu_count() or 1, 4)
+
+
+def new_parse_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Parser process pool started with "spawn": forking a threaded process that already
+    holds torch and the embedding worker risks deadlocks and copy-on-write memory growth"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def iter_parsed_files(
+    root_dir,
+    rel_paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    pool: Optional[ProcessPoolExecutor] = None
+):
+    """Yield (rel_path, documents, error) as files finish parsing, one file per worker.
+
+    At most 2 * max_workers files are in flight, so memory is bounded by the window
+    rather than the corpus. max_workers=0 parses in-process. Passing a shared `pool`
+    lets several callers draw from one globally capped set of workers.
+    """
+    rel_paths = list(rel_paths)
+    if max_workers is None:
+        max_workers = pool._max_workers if pool is not None else default_parse_workers()
+    if max_workers == 0 or (pool is None and len(rel_paths) <= 1):
+        for rel_path in rel_paths:
+            yield parse_file(root_dir, rel_path)
+        return
+
+    if pool is None:
+        with new_parse_pool(max_workers) as own_pool:
+            yield from _iter_pool(own_pool, root_dir, rel_paths, max_workers)
+    else:
+        yield from _iter_pool(pool, root_dir, rel_paths, max_workers)
+
+
+def _iter_pool(pool, root_dir, rel_paths, max_workers):
+    pending_paths = iter(rel_paths)
+    in_flight = set()
+    try:
+        for rel_path in pending_paths:
+            in_flight.add(pool.submit(parse_file, root_dir, rel_path))
+            if len(in_flight) >= 2 * max_workers:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                next_path = next(pending_paths, None)
+                if next_path is not None:
+                    in_flight.add(pool.submit(parse_file, root_dir, next_path))
+    finally:
+        # Consumer stopped early (e.g. cancelled): don't leave queued work on a shared pool
+        for future in in_flight:
+            future.cancel()
+
+
+def iter_chunk_batches(
+    root_dir,
+    rel_paths: Iterable[str],
+    text_splitter,
+    batch_size: int = 256,
+    max_workers: Optional[int] = None,
+    errors: Optional[Dict[str, str]] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+    on_parsed: Optional[Callable[[str, Optional[str]], None]] = None,
+    on_done: Optional[Callable[[str], None]] = None
+) -> Iterator[List[Tuple[str, Document]]]:
+    """Stream (rel_path, chunk) pairs in batches of at most batch_size, ready to embed.
+
+    Parse failures are collected into `errors` (rel_path -> message) when provided.
+    on_parsed(rel_path, error) fires as each file comes back from the parser;
+    on_done(rel_path) fires once every chunk of a file has been handed to the consumer,
+    which is what makes per-file checkpoints safe.
+    """
+    batch = []
+    finished = []  # files whose last chunks are still waiting in `batch`
+
+    def flush_finished():
+        for rel_path in finished:
+            if on_done:
+                on_done(rel_path)
+        finished.clear()
+
+    for rel_path, documents, error in iter_parsed_files(root_dir, rel_paths, max_workers, pool):
+        if on_parsed:
+            on_parsed(rel_path, error)
+        if error is not None:
+            if errors is not None:
+                errors[rel_path] = error
+            continue
+        # The whole file goes to the splitter at once so structure-aware splitters can carry
+        # section context across page boundaries
+        for chunk in text_splitter.split_documents(documents):
+            batch.append((rel_path, chunk))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                flush_finished()
+        if batch:
+            finished.append(rel_path)
+        elif on_done:
+            on_done(rel_path)
+    if batch:
+        yield batch
+        flush_finished()
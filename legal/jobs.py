@@ -0,0 +1,315 @@
+# Background ingestion jobs: a SQLite job table plus a globally capped worker pool.
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+from legal.ingest import default_parse_workers, new_parse_pool
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    data_dir TEXT NOT NULL,
+    vector_db_dir TEXT NOT NULL,
+    status TEXT NOT NULL,
+    files_total INTEGER NOT NULL DEFAULT 0,
+    files_parsed INTEGER NOT NULL DEFAULT 0,
+    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JobStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, created_at)")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "worker_id" not in columns:
+                # Job tables created before leases existed
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT NOT NULL DEFAULT ''")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, user_id: str, data_dir: str, vector_db_dir: str) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, data_dir, vector_db_dir, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, data_dir, vector_db_dir, QUEUED, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_user(self, user_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT 1", (user_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def active(self) -> list:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id: str, worker_id: str) -> bool:
+        """Move a queued job to running under worker_id's lease; False if another worker (or a cancel) got there first"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND status = ? AND cancel_requested = 0",
+                (RUNNING, worker_id, time.time(), job_id, QUEUED)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Renew worker_id's lease on a running job; False once the job has been taken over"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND worker_id = ?",
+                (time.time(), job_id, RUNNING, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def requeue_stale(self, job_id: str, stale_before: float) -> bool:
+        """Put a running job whose lease expired back in the queue; atomic, so only one worker does"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = '', message = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND updated_at < ?",
+                (QUEUED, "Resuming after restart", time.time(), job_id, RUNNING, stale_before)
+            )
+        return cursor.rowcount == 1
+
+    def cancel_stale(self, job_id: str, stale_before: float) -> bool:
+        """Cancel a running job whose lease expired (its worker died); False if it is still alive"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, message = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND updated_at < ?",
+                (CANCELLED, "Cancelled after its worker stopped", time.time(), job_id, RUNNING, stale_before)
+            )
+        return cursor.rowcount == 1
+
+    def request_cancel(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+
+class IngestionJobManager:
+    """Runs ingest_documents off the Streamlit script thread.
+
+    max_jobs caps how many users ingest at once; all jobs share one parse process pool
+    of parse_workers, so CPU use stays bounded however many uploads arrive together.
+    A running job is leased to the worker that claimed it, which renews the lease from a
+    heartbeat thread every stale_after / 4 seconds however long a single parse takes.
+    Jobs left queued, or running with a lease not renewed for stale_after seconds (their
+    process died), are picked up again by a janitor thread that sweeps the table every
+    heartbeat interval, so a crash followed by a quick restart still resumes. Claims and
+    takeovers are atomic, so several app workers can share one job table; a worker that
+    finds its lease taken over stops.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_jobs: int = 1,
+        parse_workers: Optional[int] = None,
+        stale_after: float = 600
+    ):
+        self.store = JobStore(db_path)
+        self.stale_after = stale_after
+        self.heartbeat_interval = stale_after / 4
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingest-job")
+        self._parse_workers = parse_workers if parse_workers is not None else default_parse_workers()
+        self._parse_pool = None
+        self._pool_lock = threading.Lock()
+        self._submitted = set()
+        self._submitted_lock = threading.Lock()
+        self._user_locks = {}
+        threading.Thread(target=self._janitor, name="ingest-janitor", daemon=True).start()
+
+    def _janitor(self):
+        while True:
+            try:
+                self.resume_interrupted()
+            except sqlite3.Error:
+                pass  # e.g. the table is locked by another worker; the next sweep retries
+            time.sleep(self.heartbeat_interval)
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        # One job per user index at a time, even when max_jobs > 1
+        with self._submitted_lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _get_parse_pool(self):
+        if self._parse_workers == 0:
+            return None
+        with self._pool_lock:
+            if self._parse_pool is None:
+                self._parse_pool = new_parse_pool(self._parse_workers)
+            return self._parse_pool
+
+    def _enqueue(self, job_id: str):
+        with self._submitted_lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def resume_interrupted(self):
+        stale_before = time.time() - self.stale_after
+        for job in self.store.active():
+            if job["status"] == RUNNING and not self.store.requeue_stale(job["id"], stale_before):
+                continue  # lease still being renewed, probably by another worker
+            self._enqueue(job["id"])
+
+    def submit(self, user_id: str, data_dir: str, vector_db_dir: str) -> str:
+        """Queue an ingestion for user_id, reusing the user's job if one is already pending"""
+        latest = self.store.latest_for_user(user_id)
+        if latest and latest["status"] == QUEUED and not latest["cancel_requested"]:
+            return latest["id"]
+        job_id = self.store.create(user_id, data_dir, vector_db_dir)
+        self._enqueue(job_id)
+        return job_id
+
+    def cancel(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        if job["status"] == QUEUED:
+            self.store.update(job_id, status=CANCELLED, cancel_requested=1, message="Cancelled before start")
+        elif job["status"] == RUNNING and not self.store.cancel_stale(job_id, time.time() - self.stale_after):
+            self.store.request_cancel(job_id)  # read by the worker holding the lease
+
+    def status(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def reconnect(self, job_id: Optional[str]) -> Optional[dict]:
+        """The job a browser session is following, if it is still queued or running"""
+        job = self.store.get(job_id) if job_id else None
+        return job if job and job["status"] in ACTIVE_STATUSES else None
+
+    def _run(self, job_id: str):
+        # Imported here: vectorstore pulls in FAISS and the embedding stack
+        from legal.vectorstore import ingest_documents
+
+        try:
+            if not self.store.claim(job_id, self.worker_id):
+                job = self.store.get(job_id)
+                if job and job["status"] == QUEUED and job["cancel_requested"]:
+                    self.store.update(job_id, status=CANCELLED, message="Cancelled before start")
+                return
+            job = self.store.get(job_id)
+            stop_heartbeat = threading.Event()
+            lease_lost = threading.Event()
+
+            def heartbeat():
+                while not stop_heartbeat.wait(self.heartbeat_interval):
+                    if not self.store.heartbeat(job_id, self.worker_id):
+                        lease_lost.set()
+                        return
+
+            def progress(files_parsed, files_total, chunks_embedded):
+                if lease_lost.is_set():
+                    return
+                self.store.update(
+                    job_id,
+                    files_parsed=files_parsed,
+                    files_total=files_total,
+                    chunks_embedded=chunks_embedded
+                )
+
+            threading.Thread(target=heartbeat, name=f"ingest-heartbeat-{job_id[:8]}", daemon=True).start()
+            try:
+                with self._user_lock(job["user_id"]):
+                    success, message = ingest_documents(
+                        job["data_dir"],
+                        job["vector_db_dir"],
+                        job["user_id"],
+                        progress=progress,
+                        should_cancel=lambda: lease_lost.is_set() or self.store.cancel_requested(job_id),
+                        parse_pool=self._get_parse_pool()
+                    )
+            except Exception as e:
+                if not lease_lost.is_set():
+                    self.store.update(job_id, status=FAILED, message=f"Error vectorizing documents: {str(e)}")
+                return
+            finally:
+                stop_heartbeat.set()
+
+            if lease_lost.is_set():
+                return  # another worker took the job over; its outcome is the one recorded
+            if success:
+                status = DONE
+            elif self.store.cancel_requested(job_id):
+                status = CANCELLED
+            else:
+                status = FAILED
+            self.store.update(job_id, status=status, message=message)
+        finally:
+            with self._submitted_lock:
+                self._submitted.discard(job_id)
+
+
+# --- Singleton accessor ---
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_job_manager(db_path: str) -> IngestionJobManager:
+    with _managers_lock:
+        if db_path not in _managers:
+            _managers[db_path] = IngestionJobManager(
+                db_path,
+                max_jobs=int(os.getenv("INGEST_MAX_JOBS", "1")),
+                parse_workers=int(os.getenv("INGEST_PARSE_WORKERS", str(default_parse_workers()))),
+                stale_after=float(os.getenv("INGEST_STALE_AFTER", "600"))
+            )
+        return _managers[db_path]
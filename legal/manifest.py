@@ -0,0 +1,57 @@
+# Per-user ingestion manifest: which file content produced which chunk IDs.
+
+import json
+import os
+from legal.utils import generate_hash
+
+MANIFEST_NAME = "manifest.json"
+
+
+def load_manifest(index_dir):
+    """Return {relative_path: {"hash": ..., "chunk_ids": [...]}} for an index directory"""
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def save_manifest(index_dir, files):
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def hash_files(root_dir, extensions, recursive=True, skip_dir=None):
+    """Hash every file under root_dir whose extension is in `extensions`; subdirectories
+    whose name satisfies skip_dir(name) are not descended into"""
+    hashes = {}
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        if skip_dir is not None:
+            dirnames[:] = [name for name in dirnames if not skip_dir(name)]
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in extensions:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            with open(full_path, "rb") as f:
+                hashes[os.path.relpath(full_path, root_dir)] = generate_hash(f.read())
+        if not recursive:
+            break
+    return hashes
+
+
+def diff_manifest(manifest, current_hashes):
+    """Split files into (to_ingest, unchanged, removed) relative paths"""
+    to_ingest = sorted(
+        path for path, file_hash in current_hashes.items()
+        if manifest.get(path, {}).get("hash") != file_hash
+    )
+    unchanged = sorted(
+        path for path, file_hash in current_hashes.items()
+        if manifest.get(path, {}).get("hash") == file_hash
+    )
+    removed = sorted(path for path in manifest if path not in current_hashes)
+    return to_ingest, unchanged, removed
@@ -0,0 +1,192 @@
+# Conversation memory: recent turns verbatim, older turns folded into a rolling summary.
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+from legal.ratelimit import estimate_tokens
+
+SUMMARY_PROMPT = """You maintain a running summary of a legal consultation between a user and an assistant.
+Update the summary with the new exchanges below. Keep the facts of the user's situation, the laws,
+sections and articles discussed, and any advice already given; drop pleasantries.
+Write at most {max_words} words of plain prose.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}
+
+Updated summary:"""
+
+
+def _format_turns(turns) -> str:
+    return "\n".join(f"User: {user}\nAssistant: {assistant}" for user, assistant in turns)
+
+
+def fallback_summarize(summary: str, turns, max_tokens: int) -> str:
+    """Extractive summary used when no model is available: one clipped line per question"""
+    lines = [summary] if summary else []
+    lines += [f"- User asked: {' '.join(user.split())[:160]}" for user, _ in turns]
+    text = "\n".join(lines)
+    return text[-max_tokens * 4:] if estimate_tokens(text) > max_tokens else text
+
+
+class ConversationMemory:
+    """Bounded chat state for one session.
+
+    The last `recent_turns` exchanges are kept verbatim for the prompt. Older ones queue up
+    and are folded into the summary `summarize_every` turns at a time, so the summarizer
+    sees only the previous summary plus the new turns, never the whole conversation.
+    With an `executor`, folding runs there instead of inside add_turn; until it finishes
+    the turns stay in `pending` and keep appearing verbatim in prompt_history.
+    The display transcript is capped at `max_messages`; each message's HTML is rendered
+    once, when it is added.
+    """
+
+    def __init__(
+        self,
+        recent_turns: int = 4,
+        summarize_every: int = 2,
+        summary_tokens: int = 400,
+        max_messages: int = 200,
+        summarizer: Optional[Callable[[str, list, int], str]] = None,
+        executor: Optional[Executor] = None
+    ):
+        self.recent_turns = recent_turns
+        self.summarize_every = summarize_every
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.executor = executor
+        self.summary = ""
+        self.recent = deque()
+        self.pending = []
+        self.messages = deque(maxlen=max_messages)
+        self.dropped_messages = 0
+        self.turns = 0
+        self._lock = threading.Lock()
+        self._folding = False
+        self._epoch = 0  # bumped by clear() so a fold still running for old turns is discarded
+
+    # --- Display transcript ---
+    def add_message(self, role: str, content: str, html_text: str):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped_messages += 1
+        self.messages.append({"role": role, "content": content, "html": html_text})
+
+    def visible_messages(self, limit: Optional[int] = None) -> List[dict]:
+        messages = list(self.messages)
+        return messages if limit is None else messages[-limit:]
+
+    # --- Prompt memory ---
+    def add_turn(self, user: str, assistant: str):
+        """Record a finished exchange; may fold the oldest turns into the summary"""
+        with self._lock:
+            self.turns += 1
+            self.recent.append((user, assistant))
+            while len(self.recent) > self.recent_turns:
+                self.pending.append(self.recent.popleft())
+            if len(self.pending) < self.summarize_every or self._folding:
+                return
+            self._folding = True
+            summary, turns, epoch = self.summary, list(self.pending), self._epoch
+        if self.executor is None:
+            self._fold(summary, turns, epoch)
+        else:
+            self.executor.submit(self._fold, summary, turns, epoch)
+
+    def _summarize(self, summary: str, turns) -> str:
+        if self.summarizer is not None:
+            try:
+                return self.summarizer(summary, turns, self.summary_tokens)
+            except Exception:
+                pass  # fall through to the extractive summary; the turns must not be lost
+        return fallback_summarize(summary, turns, self.summary_tokens)
+
+    def _fold(self, summary: str, turns, epoch: int):
+        new_summary = self._summarize(summary, turns)
+        with self._lock:
+            self._folding = False
+            if epoch != self._epoch:
+                return
+            self.summary = new_summary
+            # Turns added while the summarizer ran stay pending for the next fold
+            self.pending = self.pending[len(turns):]
+
+    def prompt_history(self, token_budget: int = 1500) -> Optional[str]:
+        """Summary plus as many recent turns (newest first) as fit in token_budget"""
+        # Snapshot under the lock: a fold finishing on the summary thread swaps summary and pending
+        with self._lock:
+            summary_text, turns = self.summary, list(self.pending) + list(self.recent)
+        sections = []
+        used = 0
+        if summary_text:
+            summary = f"Summary of earlier conversation:\n{summary_text}"
+            used = estimate_tokens(summary)
+            if used <= token_budget:
+                sections.append(summary)
+            else:
+                used = 0
+        # Turns waiting to be summarized are older than `recent` but not yet in the summary
+        kept = []
+        for turn in reversed(turns):
+            text = _format_turns([turn])
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                break
+            kept.append(text)
+            used += cost
+        sections.extend(reversed(kept))
+        return "\n\n".join(sections) if sections else None
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.recent.clear()
+            self.pending = []
+            self.messages.clear()
+            self.dropped_messages = 0
+            self.turns = 0
+            self._folding = False
+            self._epoch += 1
+
+
+def gemini_summarizer(summary: str, turns, max_tokens: int) -> str:
+    """Fold turns into the summary with a low-temperature background Gemini call: uncached,
+    and only sent when the rate limiter has budget to spare for user queries. If none frees
+    up in time the call raises and ConversationMemory falls back to fallback_summarize."""
+    from legal.gemini import get_gemini
+
+    prompt = SUMMARY_PROMPT.format(
+        max_words=int(max_tokens * 0.75),
+        summary=summary or "(none yet)",
+        turns=_format_turns(turns)
+    )
+    text = get_gemini().generate_text(prompt, model_name=os.getenv("MEMORY_SUMMARY_MODEL") or None, background=True)
+    return text[:max_tokens * 4]
+
+
+# One summarizer thread per process: summaries queue up behind each other, never behind a reply
+_summary_pool: Optional[ThreadPoolExecutor] = None
+_summary_pool_lock = threading.Lock()
+
+
+def _get_summary_pool() -> ThreadPoolExecutor:
+    global _summary_pool
+    if _summary_pool is None:
+        with _summary_pool_lock:
+            if _summary_pool is None:
+                _summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+    return _summary_pool
+
+
+def new_conversation_memory() -> ConversationMemory:
+    return ConversationMemory(
+        recent_turns=int(os.getenv("MEMORY_RECENT_TURNS", "4")),
+        summarize_every=int(os.getenv("MEMORY_SUMMARIZE_EVERY", "2")),
+        summary_tokens=int(os.getenv("MEMORY_SUMMARY_TOKENS", "400")),
+        max_messages=int(os.getenv("CHAT_HISTORY_LIMIT", "200")),
+        summarizer=gemini_summarizer,
+        executor=_get_summary_pool()
+    )
@@ -0,0 +1,198 @@
+# Page-level PDF text extraction: the native text layer first, OCR only for pages without
+# one, and every page's text cached on disk by file hash and page number.
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# A page whose native text is shorter than this is treated as scanned and sent to OCR
+MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "20"))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- Native text layer ---
+def _pdfium_pages(path: str) -> Iterator[str]:
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            text_page = page.get_textpage()
+            yield text_page.get_text_range().replace("\r\n", "\n")
+            text_page.close()
+            page.close()
+    finally:
+        pdf.close()
+
+
+def _pypdf_pages(path: str) -> Iterator[str]:
+    from pypdf import PdfReader
+    for page in PdfReader(path).pages:
+        yield page.extract_text() or ""
+
+
+def native_backend() -> str:
+    """PDF_TEXT_BACKEND, or the fastest installed one: pypdfium2, then pypdf"""
+    backend = os.getenv("PDF_TEXT_BACKEND", "auto")
+    if backend != "auto":
+        return backend
+    try:
+        import pypdfium2  # noqa: F401
+        return "pdfium"
+    except ImportError:
+        return "pypdf"
+
+
+NATIVE_BACKENDS = {"pdfium": _pdfium_pages, "pypdf": _pypdf_pages}
+
+
+# --- OCR fallback ---
+def ocr_pages(path: str, page_numbers: List[int]) -> Dict[int, str]:
+    """OCR the given 1-based pages with Unstructured, in one call on a PDF of just those pages"""
+    from pypdf import PdfReader, PdfWriter
+    from unstructured.partition.pdf import partition_pdf
+
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        writer.write(f)
+        subset_path = f.name
+    try:
+        elements = partition_pdf(filename=subset_path, strategy=os.getenv("PDF_OCR_STRATEGY", "ocr_only"))
+    finally:
+        os.remove(subset_path)
+    texts = {page_number: [] for page_number in page_numbers}
+    for element in elements:
+        subset_page = element.metadata.page_number or 1
+        if element.text:
+            texts[page_numbers[subset_page - 1]].append(element.text)
+    return {page_number: "\n\n".join(parts) for page_number, parts in texts.items()}
+
+
+# --- On-disk page cache ---
+class PageCache:
+    """SQLite table of (file_hash, page) -> zlib-compressed page text and how it was extracted"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # parser processes read while another writes
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "file_hash TEXT NOT NULL, page INTEGER NOT NULL, method TEXT NOT NULL, text BLOB NOT NULL, "
+                "PRIMARY KEY (file_hash, page))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, file_hash: str) -> Dict[int, tuple]:
+        """{page: (method, text)} for every cached page of one file"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT page, method, text FROM pages WHERE file_hash = ?", (file_hash,)).fetchall()
+        return {page: (method, zlib.decompress(blob).decode("utf-8")) for page, method, blob in rows}
+
+    def put(self, file_hash: str, pages: List[dict]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (file_hash, page, method, text) VALUES (?, ?, ?, ?)",
+                [
+                    (file_hash, page["page"], page["method"], zlib.compress(page["text"].encode("utf-8"), 6))
+                    for page in pages
+                ]
+            )
+
+
+_page_caches: Dict[str, PageCache] = {}
+_page_caches_lock = threading.Lock()
+
+
+def default_page_cache() -> Optional[PageCache]:
+    """The SQLite file named by PDF_PAGE_CACHE, or None when it is unset or "off".
+
+    The app and vectorize_documents.py point it into their vector_db_dir; there is no
+    default, so a library caller or benchmark never leaves a cache in the working directory.
+    """
+    path = os.getenv("PDF_PAGE_CACHE", "off")
+    if path == "off":
+        return None
+    with _page_caches_lock:
+        if path not in _page_caches:
+            _page_caches[path] = PageCache(path)
+        return _page_caches[path]
+
+
+# --- Extraction ---
+def extract_pages(
+    path: str,
+    cache: Optional[PageCache] = None,
+    backend: Optional[str] = None,
+    ocr: bool = True,
+    min_chars: int = MIN_PAGE_CHARS
+) -> List[dict]:
+    """Text of every page as {"page", "text", "method", "cached", "ms"} dicts, in page order.
+
+    method is "text" (native layer), "ocr", or "empty" (no text layer, OCR unavailable or
+    disabled). Every page is cached; an "empty" one is re-sent to OCR on the next run
+    instead of repeating the whole native pass.
+    """
+    file_hash = file_sha256(path) if cache is not None else None
+    started = time.perf_counter()
+    cached = cache.get(file_hash) if cache is not None else {}
+    if cached:
+        per_page_ms = 1000 * (time.perf_counter() - started) / len(cached)
+        pages = [
+            {"page": page, "text": text, "method": method, "cached": True, "ms": per_page_ms}
+            for page, (method, text) in sorted(cached.items())
+        ]
+    else:
+        pages = []
+        page_started = time.perf_counter()
+        for index, text in enumerate(NATIVE_BACKENDS[backend or native_backend()](path), start=1):
+            now = time.perf_counter()
+            method = "text" if len(text.strip()) >= min_chars else "empty"
+            pages.append({"page": index, "text": text, "method": method, "cached": False, "ms": 1000 * (now - page_started)})
+            page_started = now
+
+    missing = [page for page in pages if page["method"] == "empty"] if ocr else []
+    if missing:
+        ocr_started = time.perf_counter()
+        try:
+            recognized = ocr_pages(path, [page["page"] for page in missing])
+        except Exception:
+            recognized = {}  # Unstructured/Tesseract not installed or failed: keep the native text
+        per_page_ms = 1000 * (time.perf_counter() - ocr_started) / len(missing)
+        for page in missing:
+            page["ms"] += per_page_ms
+            if page["page"] in recognized:
+                page["text"] = recognized[page["page"]]
+                page["method"] = "ocr"
+                page["cached"] = False
+
+    if cache is not None:
+        fresh = [page for page in pages if not page["cached"]]
+        if fresh:
+            cache.put(file_hash, fresh)
+    return pages
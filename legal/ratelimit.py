@@ -0,0 +1,104 @@
+# Process-wide token-bucket limiter sized to the Gemini RPM/TPM quota.
+
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for TPM accounting"""
+    return len(text) // 4 + 1
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised by wait_background when no spare budget turned up within max_wait"""
+
+
+class TokenBucketLimiter:
+    """Two buckets (requests/min and tokens/min) shared by every session in the process.
+
+    Callers reserve capacity up front; the balance may go negative, and the caller
+    waits for the deficit to refill. That keeps reservations FIFO without a queue.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._updated_at = now
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Take one request and `tokens` tokens; return how long the caller must wait"""
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._requests -= 1
+            self._tokens -= tokens
+            request_wait = -self._requests * 60 / self.rpm if self._requests < 0 else 0.0
+            token_wait = -self._tokens * 60 / self.tpm if self._tokens < 0 else 0.0
+            return max(request_wait, token_wait)
+
+    def wait(self, tokens: int = 1) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def wait_background(
+        self,
+        tokens: int = 1,
+        headroom: float = 0.5,
+        poll: float = 1.0,
+        max_wait: Optional[float] = None
+    ) -> float:
+        """Low-priority wait: reserve only while at least `headroom` of the request bucket is
+        free, so background calls never spend the budget interactive requests are about to need.
+        Raises RateLimitTimeout if that hasn't happened after max_wait seconds."""
+        tokens = min(tokens, self.tpm)
+        # Never above rpm: with a tiny quota (rpm=1) a full bucket is all the headroom there can be
+        free_requests = min(self.rpm, self.rpm * headroom + 1)
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._requests >= free_requests and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+            waited = time.monotonic() - started
+            if max_wait is not None and waited >= max_wait:
+                raise RateLimitTimeout(f"no spare rate-limit budget after {waited:.1f}s")
+            time.sleep(poll if max_wait is None else min(poll, max_wait - waited))
+
+    async def wait_async(self, tokens: int = 1) -> float:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+# --- Singleton accessor ---
+_limiter: Optional[TokenBucketLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucketLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucketLimiter(
+                    rpm=float(os.getenv("GEMINI_RPM", "15")),
+                    tpm=float(os.getenv("GEMINI_TPM", "1000000"))
+                )
+    return _limiter
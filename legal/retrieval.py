@@ -0,0 +1,288 @@
+# Hybrid retrieval: persisted BM25 + FAISS, fused with reciprocal rank fusion, optional cross-encoder rerank.
+
+import json
+import math
+import os
+import re
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from legal.tracing import get_tracer
+
+BM25_NAME = "bm25.json"
+DEFAULT_RERANKER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Keeps statute references intact as tokens: "Section 138 NI Act" -> section, 138, ni, act;
+# "Article 21A" -> article, 21a
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index over chunk texts, keyed by the same chunk IDs as the FAISS docstore"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.doc_lens: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avgdl = 0.0
+
+    @classmethod
+    def from_texts(cls, ids: List[str], texts: List[str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        postings = defaultdict(list)
+        for doc_idx, (doc_id, text) in enumerate(zip(ids, texts)):
+            tokens = tokenize(text)
+            index.ids.append(doc_id)
+            index.doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_idx, tf))
+        index.postings = dict(postings)
+        index.avgdl = sum(index.doc_lens) / len(index.doc_lens) if index.doc_lens else 0.0
+        return index
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, **kwargs) -> "BM25Index":
+        ids, texts = [], []
+        for doc_id in vectorstore.index_to_docstore_id.values():
+            document = vectorstore.docstore.search(doc_id)
+            if isinstance(document, Document):
+                ids.append(doc_id)
+                texts.append(document.page_content)
+        return cls.from_texts(ids, texts, **kwargs)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / self.avgdl)
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[doc_idx], score) for doc_idx, score in ranked]
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "ids": self.ids,
+                "doc_lens": self.doc_lens,
+                "postings": self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.ids = data["ids"]
+        index.doc_lens = data["doc_lens"]
+        index.postings = {term: [tuple(p) for p in postings] for term, postings in data["postings"].items()}
+        index.avgdl = sum(index.doc_lens) / len(index.doc_lens) if index.doc_lens else 0.0
+        return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def vector_search(vectorstore, query: str, k: int) -> List[Tuple[str, float]]:
+    """FAISS search returning (chunk_id, distance) so results can be fused by ID"""
+    import numpy as np
+    import faiss
+
+    tracer = get_tracer()
+    with tracer.span("retrieval.embed_query"):
+        vector = np.array([vectorstore.embedding_function.embed_query(query)], dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(vector)
+    with tracer.span("retrieval.faiss_search", k=k):
+        distances, indices = vectorstore.index.search(vector, k)
+    return [
+        (vectorstore.index_to_docstore_id[i], float(d))
+        for d, i in zip(distances[0], indices[0])
+        if i != -1
+    ]
+
+
+# --- Cross-encoder reranker (loaded once per process) ---
+_rerankers = {}
+_reranker_lock = threading.Lock()
+
+
+def get_reranker(model_name: str = DEFAULT_RERANKER):
+    if model_name not in _rerankers:
+        with _reranker_lock:
+            if model_name not in _rerankers:
+                from sentence_transformers import CrossEncoder
+                _rerankers[model_name] = CrossEncoder(model_name, device="cpu")
+    return _rerankers[model_name]
+
+
+class HybridRetriever:
+    """Drop-in for vectorstore.as_retriever(): fuses BM25 and dense rankings.
+
+    mode is "hybrid", "dense" or "bm25". The cross-encoder rerank only runs while the
+    first stages stayed within latency_budget_ms, so a slow query degrades to plain RRF.
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        bm25: Optional[BM25Index] = None,
+        k: int = 3,
+        candidates: int = 20,
+        mode: str = "hybrid",
+        rerank: bool = False,
+        rerank_top_n: int = 10,
+        reranker_model: str = DEFAULT_RERANKER,
+        latency_budget_ms: float = 500,
+        rrf_k: int = 60
+    ):
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.k = k
+        self.candidates = candidates
+        self.mode = mode if bm25 is not None else "dense"
+        self.rerank = rerank
+        self.rerank_top_n = rerank_top_n
+        self.reranker_model = reranker_model
+        self.latency_budget_ms = latency_budget_ms
+        self.rrf_k = rrf_k
+        self.last_timings: Dict[str, float] = {}
+
+    def _document(self, doc_id: str, score: float) -> Optional[Document]:
+        document = self.vectorstore.docstore.search(doc_id)
+        if not isinstance(document, Document):
+            return None
+        return Document(
+            page_content=document.page_content,
+            metadata={**document.metadata, "chunk_id": doc_id, "score": score, "score_type": "rrf"}
+        )
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        started = time.perf_counter()
+        timings = {}
+        rankings = []
+
+        if self.mode in ("hybrid", "dense"):
+            stage_start = time.perf_counter()
+            rankings.append([doc_id for doc_id, _ in vector_search(self.vectorstore, query, self.candidates)])
+            timings["vector_ms"] = 1000 * (time.perf_counter() - stage_start)
+        if self.mode in ("hybrid", "bm25"):
+            stage_start = time.perf_counter()
+            rankings.append([doc_id for doc_id, _ in self.bm25.search(query, self.candidates)])
+            timings["bm25_ms"] = 1000 * (time.perf_counter() - stage_start)
+
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        elapsed_ms = 1000 * (time.perf_counter() - started)
+        if self.rerank and fused and elapsed_ms < self.latency_budget_ms:
+            stage_start = time.perf_counter()
+            head = [doc for doc in (self._document(doc_id, score) for doc_id, score in fused[:self.rerank_top_n]) if doc]
+            scores = get_reranker(self.reranker_model).predict([(query, doc.page_content) for doc in head])
+            for doc, score in zip(head, scores):
+                doc.metadata["score"] = float(score)
+                doc.metadata["score_type"] = "rerank"
+            documents = sorted(head, key=lambda doc: doc.metadata["score"], reverse=True)[:self.k]
+            timings["rerank_ms"] = 1000 * (time.perf_counter() - stage_start)
+        else:
+            documents = [doc for doc in (self._document(doc_id, score) for doc_id, score in fused[:self.k]) if doc]
+
+        timings["total_ms"] = 1000 * (time.perf_counter() - started)
+        self.last_timings = timings
+        tracer = get_tracer()
+        for stage in ("bm25", "rerank"):
+            if f"{stage}_ms" in timings:
+                tracer.record(f"retrieval.{stage}", timings[f"{stage}_ms"])
+        if self.rerank and fused and "rerank_ms" not in timings:
+            tracer.incr("rerank_skipped", reason="latency_budget")
+        tracer.record("retrieval.total", timings["total_ms"], mode=self.mode, documents=len(documents))
+        return documents
+
+    def invoke(self, query: str) -> List[Document]:
+        return self.get_relevant_documents(query)
+
+
+# --- Shared + private corpus ---
+_merge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="merged-retrieval")
+
+
+class MergedRetriever:
+    """Query several retrievers at once (e.g. a user's private index and the shared corpus)
+    and merge their results by score.
+
+    The sub-queries run concurrently, so their query embeddings land in the same embedding
+    micro-batch. Scores are only compared directly when every list carries the same kind
+    (all RRF or all cross-encoder); otherwise the lists are fused by rank. Each document
+    records which corpus it came from, and identical chunks are kept once.
+    """
+
+    def __init__(self, retrievers: List[Tuple[str, "HybridRetriever"]], k: int = 3):
+        self.retrievers = retrievers
+        self.k = k
+        self.last_timings: Dict[str, float] = {}
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        started = time.perf_counter()
+        futures = [
+            _merge_pool.submit(contextvars.copy_context().run, retriever.get_relevant_documents, query)
+            for _, retriever in self.retrievers
+        ]
+        results = []
+        timings = {}
+        for (name, retriever), future in zip(self.retrievers, futures):
+            documents = future.result()
+            for document in documents:
+                document.metadata["corpus"] = name
+            results.append(documents)
+            timings[f"{name}_ms"] = retriever.last_timings.get("total_ms", 0.0)
+
+        candidates = [doc for documents in results for doc in documents]
+        if len({doc.metadata.get("score_type") for doc in candidates}) > 1:
+            by_id = {id(doc): doc for doc in candidates}
+            fused = reciprocal_rank_fusion([[id(doc) for doc in documents] for documents in results])
+            ranked = []
+            for doc_key, score in fused:
+                by_id[doc_key].metadata.update(score=score, score_type="rrf")
+                ranked.append(by_id[doc_key])
+        else:
+            ranked = sorted(candidates, key=lambda doc: doc.metadata.get("score", 0.0), reverse=True)
+
+        merged, seen = [], set()
+        for document in ranked:
+            if document.page_content in seen:
+                continue
+            seen.add(document.page_content)
+            merged.append(document)
+            if len(merged) == self.k:
+                break
+
+        timings["total_ms"] = 1000 * (time.perf_counter() - started)
+        self.last_timings = timings
+        get_tracer().record("retrieval.merged", timings["total_ms"], sources=len(self.retrievers))
+        return merged
+
+    def invoke(self, query: str) -> List[Document]:
+        return self.get_relevant_documents(query)
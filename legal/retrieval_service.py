@@ -0,0 +1,177 @@
+# Standalone retrieval service: one process holds the embedding model and the persisted
+# indexes, and any number of Streamlit workers query it over HTTP or a Unix socket.
+#
+#     python -m legal.retrieval_service --vector-db-dir vector_db_dir --port 8765
+#     RETRIEVAL_SERVICE_URL=http://127.0.0.1:8765 streamlit run main.py
+
+import argparse
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from legal.embeddings import get_embedding_engine
+from legal.tracing import get_tracer
+from legal.vectorstore import build_retriever, cached_index_dirs, evict_cached_index, evict_idle_indexes
+
+# User IDs become directory names; anything else could walk out of vector_db_dir
+_USER_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class RetrievalService:
+    """Search per-user (and shared) indexes loaded in this process.
+
+    Concurrent requests are served on separate threads; their query embeddings meet in the
+    embedding engine's micro-batch queue, and FAISS releases the GIL while it searches.
+    Tenants nobody has queried for idle_ttl seconds are evicted by a janitor thread.
+    """
+
+    def __init__(self, vector_db_dir, idle_ttl=600.0, batch_workers=16):
+        self.vector_db_dir = vector_db_dir
+        self.idle_ttl = idle_ttl
+        self._batch_pool = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix="search-batch")
+        self._janitor = None
+        self.tracer = get_tracer()
+
+    def search(self, user_id=None, query="", k=3, include_shared=True):
+        if user_id is not None and not _USER_ID_RE.match(str(user_id)):
+            raise ValueError(f"Invalid user_id {user_id!r}")
+        errors = []
+        with self.tracer.span("service.search"):
+            retriever = build_retriever(
+                self.vector_db_dir, user_id, k=int(k), include_shared=include_shared, on_error=errors.append
+            )
+            documents = retriever.get_relevant_documents(query) if retriever else []
+        return {
+            "documents": [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents],
+            "timings": retriever.last_timings if retriever else {},
+            "error": errors[-1] if errors else None,
+        }
+
+    def search_batch(self, requests):
+        futures = [self._batch_pool.submit(self.search, **request) for request in requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({"documents": [], "timings": {}, "error": str(e)})
+        return results
+
+    def evict(self, user_id=None):
+        if user_id is not None and not _USER_ID_RE.match(str(user_id)):
+            raise ValueError(f"Invalid user_id {user_id!r}")
+        evict_cached_index(self.vector_db_dir, user_id)
+        return {"evicted": user_id}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "cached_indexes": cached_index_dirs(),
+            "embedding": get_embedding_engine().stats(),
+        }
+
+    def start_janitor(self, interval=30.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                evicted = evict_idle_indexes(self.idle_ttl)
+                if evicted:
+                    self.tracer.incr("service_tenant_evictions", len(evicted))
+
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=run, name="tenant-janitor", daemon=True)
+            self._janitor.start()
+
+
+def make_handler(service):
+    routes = {
+        "/search": lambda payload: service.search(**payload),
+        "/search_batch": lambda payload: {"results": service.search_batch(payload.get("requests", []))},
+        "/evict": lambda payload: service.evict(**payload),
+    }
+
+    class RetrievalHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled client connections are reused
+
+        def _reply(self, status, body, content_type="application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            route = routes.get(self.path.split("?")[0])
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b"{}"
+            if route is None:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                self._reply(200, route(json.loads(raw)))
+            except (TypeError, ValueError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/health":
+                self._reply(200, service.health())
+            elif path == "/metrics":
+                self._reply(200, service.tracer.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def log_message(self, *args):
+            pass
+
+    return RetrievalHandler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(vector_db_dir, host="127.0.0.1", port=8765, unix_socket=None, idle_ttl=600.0, warm_up=True):
+    service = RetrievalService(vector_db_dir, idle_ttl=idle_ttl)
+    handler = make_handler(service)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, handler)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+    if warm_up:
+        get_embedding_engine().warm_up()
+    service.start_janitor()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embedding + index search to Streamlit workers")
+    parser.add_argument("--vector-db-dir", default="vector_db_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--idle-ttl", type=float, default=float(os.getenv("RETRIEVAL_IDLE_TTL", "600")),
+                        help="seconds before an unqueried tenant's index is dropped from memory")
+    args = parser.parse_args()
+
+    server = serve(args.vector_db_dir, args.host, args.port, args.unix_socket, args.idle_ttl)
+    print(f"Retrieval service listening on {args.unix_socket or f'{args.host}:{args.port}'}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Model routing: pick the Gemini model order for each request from rolling per-model
+# latency and error stats, and decide when a slow call is worth hedging.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from legal.ratelimit import estimate_tokens
+from legal.tracing import current_request_id, get_tracer
+from legal.utils import percentile
+
+LATENCY_KINDS = ("full", "first_token")
+
+
+def is_quota_error(error: Exception) -> bool:
+    text = str(error).lower()
+    return "quota" in text or "429" in text or "resource exhausted" in text or "resourceexhausted" in text
+
+
+class ModelStats:
+    """Rolling window of one model's outcomes and successful-call latencies"""
+
+    def __init__(self, window: int):
+        self.latency_ms = {kind: deque(maxlen=window) for kind in LATENCY_KINDS}
+        self.outcomes = deque(maxlen=window)  # True = success
+        self.cooldown_until = 0.0
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ModelRouter:
+    """Orders candidate models per request and tracks how each one is doing.
+
+    Short questions without retrieved context, and prompts hinted as "faq", go to
+    fast_model first; everything else to primary_model, then the fallbacks. A model whose
+    recent error rate exceeds max_error_rate, or that hit a quota error within
+    quota_cooldown seconds, is moved behind the healthy ones. hedge_delay() is a model's
+    rolling p95: a call still running after it is raced against the next candidate.
+    """
+
+    def __init__(
+        self,
+        primary_model: str,
+        fast_model: Optional[str] = None,
+        fallback_models: tuple = (),
+        short_query_tokens: int = 32,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        quota_cooldown: float = 60.0,
+        hedge: bool = True,
+        hedge_min_ms: float = 1500.0,
+        window: int = 200,
+        log_path: Optional[str] = None,
+        log_size: int = 500
+    ):
+        self.primary_model = primary_model
+        self.fast_model = fast_model
+        self.fallback_models = tuple(fallback_models)
+        self.short_query_tokens = short_query_tokens
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.quota_cooldown = quota_cooldown
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.window = window
+        self.log_path = log_path
+        self.decisions = deque(maxlen=log_size)
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self.tracer = get_tracer()
+
+    def _model_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window)
+        return stats
+
+    # --- Routing ---
+    def healthy(self, model: str) -> bool:
+        with self._lock:
+            stats = self._model_stats(model)
+            if time.monotonic() < stats.cooldown_until:
+                return False
+            return len(stats.outcomes) < self.min_samples or stats.error_rate() <= self.max_error_rate
+
+    def route(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        model_name: Optional[str] = None,
+        hint: Optional[str] = None
+    ) -> dict:
+        """Start a routing decision; the caller tries decision["candidates"] in order"""
+        if model_name:
+            reason, preferred = "explicit", [model_name, self.primary_model]
+        elif self.fast_model and hint == "faq":
+            reason, preferred = "faq", [self.fast_model, self.primary_model]
+        elif self.fast_model and not context and estimate_tokens(prompt) <= self.short_query_tokens:
+            reason, preferred = "short", [self.fast_model, self.primary_model]
+        else:
+            reason, preferred = "default", [self.primary_model]
+        order = []
+        for model in preferred + list(self.fallback_models) + [self.fast_model]:
+            if model and model not in order:
+                order.append(model)
+        healthy = [model for model in order if self.healthy(model)]
+        candidates = healthy + [model for model in order if model not in healthy]
+        if candidates[0] != order[0]:
+            reason += ":demoted"
+        return {
+            "ts": time.time(),
+            "request_id": current_request_id(),
+            "reason": reason,
+            "candidates": candidates,
+            "hedged": False,
+            "winner": None,
+            "latency_ms": None,
+            "error": None,
+        }
+
+    def hedge_delay(self, model: str, kind: str = "full") -> Optional[float]:
+        """Seconds to wait on `model` before racing a second one; None = don't hedge yet"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            samples = list(self._model_stats(model).latency_ms[kind])
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.hedge_min_ms, percentile(samples, 95)) / 1000
+
+    # --- Feedback ---
+    def record(self, model: str, latency_ms: Optional[float] = None, kind: str = "full", error=None):
+        """One finished call: its latency on success, or the exception it raised"""
+        with self._lock:
+            stats = self._model_stats(model)
+            stats.outcomes.append(error is None)
+            if error is None and latency_ms is not None:
+                stats.latency_ms[kind].append(latency_ms)
+            if error is not None and is_quota_error(error):
+                stats.cooldown_until = time.monotonic() + self.quota_cooldown
+
+    def finish(self, decision: dict, winner: Optional[str], latency_ms: float, error=None):
+        """Close a decision: counters for the dashboard, one JSON line for offline analysis"""
+        decision["winner"] = winner
+        decision["latency_ms"] = round(latency_ms, 3)
+        decision["error"] = str(error) if error is not None else None
+        self.tracer.incr("model_routes", model=winner or "none", reason=decision["reason"])
+        if winner and winner != decision["candidates"][0]:
+            self.tracer.incr("model_fallbacks", model=winner)
+        if decision["hedged"]:
+            self.tracer.incr("model_hedges", won="hedge" if winner and winner != decision["candidates"][0] else "primary")
+        self.decisions.append(decision)
+        if self.log_path:
+            line = json.dumps(decision, ensure_ascii=False)
+            with self._log_lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            snapshot = {
+                model: (
+                    {kind: list(values) for kind, values in stats.latency_ms.items()},
+                    stats.error_rate(),
+                    len(stats.outcomes),
+                    time.monotonic() < stats.cooldown_until,
+                )
+                for model, stats in self._stats.items()
+            }
+        return {
+            model: {
+                "p50_ms": percentile(latencies["full"], 50),
+                "p95_ms": percentile(latencies["full"], 95),
+                "first_token_p95_ms": percentile(latencies["first_token"], 95),
+                "error_rate": error_rate,
+                "calls": calls,
+                "cooling_down": cooling,
+            }
+            for model, (latencies, error_rate, calls, cooling) in snapshot.items()
+        }
+
+    def recent_decisions(self, limit: int = 50) -> List[dict]:
+        return list(self.decisions)[-limit:]
+
+
+def default_model_router(primary_model: str) -> ModelRouter:
+    """Router configured from the environment; GEMINI_ROUTER=0 pins every call to primary_model"""
+    if os.getenv("GEMINI_ROUTER", "1") == "0":
+        return ModelRouter(primary_model, hedge=False)
+    fallbacks = os.getenv("GEMINI_FALLBACK_MODELS", "gemini-1.0-pro")
+    return ModelRouter(
+        os.getenv("GEMINI_PRIMARY_MODEL") or primary_model,
+        fast_model=os.getenv("GEMINI_FAST_MODEL", "gemini-1.5-flash-8b") or None,
+        fallback_models=tuple(model.strip() for model in fallbacks.split(",") if model.strip()),
+        short_query_tokens=int(os.getenv("ROUTER_SHORT_QUERY_TOKENS", "32")),
+        max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5")),
+        quota_cooldown=float(os.getenv("ROUTER_QUOTA_COOLDOWN", "60")),
+        hedge=os.getenv("ROUTER_HEDGE", "1") != "0",
+        hedge_min_ms=float(os.getenv("ROUTER_HEDGE_MIN_MS", "1500")),
+        log_path=os.getenv("ROUTER_DECISIONS_JSONL") or None
+    )
@@ -0,0 +1,254 @@
+# Lightweight request tracing: per-stage spans, rolling latency windows and counters,
+# exported as Prometheus text over HTTP and/or one JSON line per request.
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from legal.utils import percentile
+
+QUANTILES = (50, 95, 99)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "started", "duration_ms")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration_ms = 0.0
+
+
+class Trace:
+    """Spans recorded while handling one user request"""
+
+    def __init__(self, user_id: Optional[str], request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.user_id = user_id
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": self.timestamp,
+            "request_id": self.request_id,
+            "user_id": self.user_id,
+            "total_ms": round(1000 * (time.perf_counter() - self.started), 3),
+            "spans": [
+                {
+                    "name": span.name,
+                    "offset_ms": round(1000 * (span.started - self.started), 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    **span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    """Process-wide metrics registry.
+
+    Latencies keep the last `window` samples per stage, so percentiles are rolling and
+    recording a sample is one deque append; quantiles are only computed at export time.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 2048, jsonl_path: Optional[str] = None):
+        self.enabled = enabled
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self._samples: Dict[str, deque] = {}
+        self._totals = defaultdict(lambda: [0, 0.0])  # stage -> [count, sum_ms]
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._jsonl_lock = threading.Lock()
+
+    # --- Recording ---
+    def observe(self, name: str, duration_ms: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(duration_ms)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += duration_ms
+
+    def incr(self, name: str, amount: int = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block; the span is attached to the current request trace if there is one"""
+        span = Span(name, attrs)
+        try:
+            yield span
+        except BaseException:
+            span.attrs["error"] = True
+            raise
+        finally:
+            span.duration_ms = 1000 * (time.perf_counter() - span.started)
+            if self.enabled:
+                self.observe(name, span.duration_ms)
+                trace = _current_trace.get()
+                if trace is not None:
+                    trace.spans.append(span)
+
+    def record(self, name: str, duration_ms: float, **attrs):
+        """Add an already-measured stage (e.g. a limiter wait) as if it had been a span"""
+        if not self.enabled:
+            return
+        self.observe(name, duration_ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            span = Span(name, attrs)
+            span.started -= duration_ms / 1000
+            span.duration_ms = duration_ms
+            trace.spans.append(span)
+
+    @contextmanager
+    def request(self, user_id: Optional[str] = None, request_id: Optional[str] = None):
+        """Open a trace for one user request; every span inside it carries its request ID"""
+        trace = Trace(user_id, request_id)
+        token = _current_trace.set(trace)
+        try:
+            with self.span("request"):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            if self.enabled and self.jsonl_path:
+                self._write_jsonl(trace)
+
+    def _write_jsonl(self, trace: Trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with self._jsonl_lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    # --- Export ---
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            totals = {name: tuple(values) for name, values in self._totals.items()}
+            counters = dict(self._counters)
+        return {
+            "latency_ms": {
+                name: {
+                    **{f"p{q}": percentile(values, q) for q in QUANTILES},
+                    "count": totals[name][0],
+                    "sum": totals[name][1],
+                }
+                for name, values in samples.items()
+            },
+            "counters": {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in counters.items()
+            },
+        }
+
+    def render_prometheus(self, prefix: str = "legal_rag") -> str:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            totals = {name: tuple(values) for name, values in self._totals.items()}
+            counters = dict(self._counters)
+
+        metric = f"{prefix}_stage_latency_ms"
+        lines = [f"# HELP {metric} Rolling per-stage latency in milliseconds", f"# TYPE {metric} summary"]
+        for name in sorted(samples):
+            for q in QUANTILES:
+                lines.append(f'{metric}{{stage="{name}",quantile="{q / 100}"}} {percentile(samples[name], q):.3f}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {totals[name][1]:.3f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {totals[name][0]}')
+
+        by_name = defaultdict(list)
+        for (name, labels), value in counters.items():
+            by_name[name].append((labels, value))
+        for name in sorted(by_name):
+            counter = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {counter} counter")
+            for labels, value in sorted(by_name[name]):
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{counter}{{{label_text}}} {value}" if label_text else f"{counter} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+# --- Prometheus text endpoint ---
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics from a daemon thread; safe to call on every Streamlit rerun"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        tracer = get_tracer()
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body = tracer.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/metrics.json":
+                    body = json.dumps(tracer.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError:
+            # Port already taken (e.g. a second app process); that process keeps serving
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
+
+
+# --- Singleton accessor ---
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(
+                    enabled=os.getenv("TRACING_ENABLED", "1") != "0",
+                    window=int(os.getenv("TRACE_WINDOW", "2048")),
+                    jsonl_path=os.getenv("TRACE_JSONL") or None
+                )
+    return _tracer
@@ -1,6 +1,7 @@
 # Utility functions (hashing, helpers, etc.) will go here.
 
 import hashlib
+import math
 
 def generate_hash(file_bytes):
     """Generate a hash for the uploaded file to track changes"""
@@ -22,3 +23,11 @@ def get_legal_domains():
         "Tax Law",
         "Environmental Law"
     ]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (pct in 0-100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -1,49 +1,763 @@
+import hashlib
+import http.client
+import json
 import os
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import UnstructuredFileLoader, DirectoryLoader
-from langchain_text_splitters import CharacterTextSplitter
+import pickle
+import queue
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+import weakref
+from collections import OrderedDict
+from langchain_core.documents import Document
 import streamlit as st
+from legal.embeddings import get_embedding_engine
+from legal.manifest import MANIFEST_NAME, load_manifest, save_manifest, hash_files, diff_manifest
+from legal.ingest import SUPPORTED_EXTENSIONS, iter_chunk_batches
+from legal.retrieval import BM25_NAME, BM25Index, HybridRetriever, MergedRetriever
+from legal.chunking import LegalTextSplitter
+from legal.tracing import get_tracer
+
+INDEX_NAME = "index"
+SERVING_INDEX_NAME = "serving"
+MAX_CACHED_INDEXES = int(os.getenv("VECTORSTORE_CACHE_SIZE", "8"))
+INDEX_MODE = os.getenv("INDEX_MODE", "auto")
+INDEX_MODES = ("flat", "hnsw", "hnsw-sq", "ivf-sq", "ivfpq")
+SHARED_INDEX_NAME = "_shared"  # vector_db_dir/_shared: the read-only corpus every user searches
+CURRENT_NAME = "CURRENT"  # names the live generation directory inside an index dir
+_GENERATION_RE = re.compile(r"^g(\d{8})$")
+
+# --- Process-wide index cache ---
+# Keyed by (index_dir, kind, index_version) so a re-saved index is picked up on the
+# next query while untouched indexes are served straight from memory. `kind` lets the
+# FAISS store and its companion BM25 index share one LRU.
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+_pinned_dirs = set()  # indexes that are never evicted (the shared corpus)
+_last_used = {}  # index_dir -> monotonic time of the last cache hit or load
+_loaded_from = weakref.WeakKeyDictionary()  # vectorstore -> (live_dir, version) it was read from
+
+
+def _index_dir(vector_db_dir, user_id=None):
+    if user_id:
+        return os.path.join(vector_db_dir, user_id)
+    return vector_db_dir
+
+
+# --- Index generations ---
+# Every save writes a complete set of index files (index.faiss/.pkl, serving.*, bm25.json)
+# and the manifest that describes them into a temporary directory inside index_dir, renames it to the next gNNNNNNNN and then
+# atomically points CURRENT at it. Readers resolve CURRENT once and load everything from
+# that directory, so a background ingestion never hands them the flat index of one save
+# next to the docstore of another; the generation name is the cache version. Indexes
+# saved before generations existed sit directly in index_dir and are still read.
+
+def _live_index(index_dir):
+    """Return (directory holding the live index files, version stamp), or (None, None)"""
+    try:
+        with open(os.path.join(index_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+            generation = f.read().strip()
+        return os.path.join(index_dir, generation), generation
+    except FileNotFoundError:
+        pass
+    stamps = []
+    for name in (f"{INDEX_NAME}.faiss", f"{INDEX_NAME}.pkl"):
+        try:
+            stat = os.stat(os.path.join(index_dir, name))
+        except FileNotFoundError:
+            return None, None
+        stamps.append((stat.st_mtime_ns, stat.st_size))
+    return index_dir, tuple(stamps)
+
+
+def _index_version(index_dir):
+    """Return a version stamp for a persisted index, or None if it doesn't exist"""
+    return _live_index(index_dir)[1]
+
+
+def live_index_dir(index_dir):
+    """Directory holding the files of the index currently served from index_dir, or None"""
+    return _live_index(index_dir)[0]
+
+
+def index_available(vector_db_dir, user_id=None):
+    return _index_version(_index_dir(vector_db_dir, user_id)) is not None
+
+
+def _publish(index_dir, write):
+    """Have write(tmp_dir) produce a full set of index files, make them live atomically and
+    return the new generation name"""
+    os.makedirs(index_dir, exist_ok=True)
+    live_dir, _ = _live_index(index_dir)
+    previous = os.path.basename(live_dir) if live_dir and live_dir != index_dir else None
+    number = int(_GENERATION_RE.match(previous).group(1)) + 1 if previous else 1
+    generation = f"g{number:08d}"
+    generation_dir = os.path.join(index_dir, generation)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=index_dir)
+    try:
+        write(tmp_dir)
+        shutil.rmtree(generation_dir, ignore_errors=True)  # left by a save that died before the swap
+        os.replace(tmp_dir, generation_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    pointer_tmp = os.path.join(index_dir, f"{CURRENT_NAME}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_NAME))
+    # The previous generation stays for readers that resolved CURRENT just before the swap
+    _remove_generations(index_dir, keep={generation, previous})
+    if previous is not None:
+        _remove_legacy_files(index_dir)
+    return generation
+
+
+def _remove_generations(index_dir, keep=()):
+    for name in os.listdir(index_dir):
+        if name not in keep and (_GENERATION_RE.match(name) or name.startswith(".tmp-")):
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def _remove_legacy_files(index_dir):
+    for name in (
+        f"{INDEX_NAME}.faiss", f"{INDEX_NAME}.pkl", f"{SERVING_INDEX_NAME}.faiss", f"{SERVING_INDEX_NAME}.json",
+        BM25_NAME, MANIFEST_NAME
+    ):
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _remove_index_files(index_dir):
+    pointer = os.path.join(index_dir, CURRENT_NAME)
+    if os.path.exists(pointer):
+        os.remove(pointer)
+    _remove_generations(index_dir)
+    _remove_legacy_files(index_dir)
+
+
+def _cache_get(key):
+    with _index_cache_lock:
+        vectorstore = _index_cache.get(key)
+        if vectorstore is not None:
+            _index_cache.move_to_end(key)
+            _last_used[key[0]] = time.monotonic()
+    get_tracer().incr("index_cache", kind=key[1], result="hit" if vectorstore is not None else "miss")
+    return vectorstore
+
+
+def _cache_put(key, vectorstore):
+    with _index_cache_lock:
+        # Drop older versions of the same index before inserting the new one
+        for stale_key in [k for k in _index_cache if k[:2] == key[:2] and k != key]:
+            del _index_cache[stale_key]
+        _index_cache[key] = vectorstore
+        _index_cache.move_to_end(key)
+        _last_used[key[0]] = time.monotonic()
+        # Pinned indexes don't count against the LRU budget
+        evictable = [k for k in _index_cache if k[0] not in _pinned_dirs]
+        while len(evictable) > MAX_CACHED_INDEXES:
+            del _index_cache[evictable.pop(0)]
+
+
+def _evict_cached(index_dir):
+    with _index_cache_lock:
+        for key in [k for k in _index_cache if k[0] == index_dir]:
+            del _index_cache[key]
+        _last_used.pop(index_dir, None)
+
+
+def evict_cached_index(vector_db_dir, user_id=None):
+    """Drop every cached version of an index held by this process"""
+    _evict_cached(_index_dir(vector_db_dir, user_id))
+
+
+def evict_vectorstore(vector_db_dir, user_id=None):
+    """Drop every cached version of an index (e.g. after its files were deleted), here and in
+    the retrieval service when one is configured"""
+    evict_cached_index(vector_db_dir, user_id)
+    if retrieval_service_url():
+        get_retrieval_client().evict(user_id)
+
+
+def evict_idle_indexes(max_idle_s):
+    """Drop indexes (other than pinned ones) nobody has queried for max_idle_s; returns their dirs"""
+    cutoff = time.monotonic() - max_idle_s
+    with _index_cache_lock:
+        idle = [d for d, used in _last_used.items() if used < cutoff and d not in _pinned_dirs]
+    for index_dir in idle:
+        _evict_cached(index_dir)
+    return idle
+
+
+def cached_index_dirs():
+    with _index_cache_lock:
+        return sorted({key[0] for key in _index_cache})
+
+
+# --- Compressed serving indexes ---
+# index.faiss always holds the exact flat index: it is what incremental ingestion
+# mutates (flat indexes support delete by position). When a corpus is large enough,
+# a compressed/approximate copy is derived from it and saved as serving.faiss with the
+# same vector order, so index_to_docstore_id stays valid and queries never touch the
+# full-precision vectors.
+
+def choose_index_mode(n_vectors, mode=None):
+    mode = mode or INDEX_MODE
+    if mode != "auto":
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown INDEX_MODE {mode!r}; expected auto or one of {INDEX_MODES}")
+        if n_vectors < 1_000:
+            return "flat"  # nothing to gain, and too few points to train on
+        if mode.startswith("ivf") and n_vectors < 25_000:
+            return "hnsw-sq"  # IVF wants ~39 training points per list
+        return mode
+    if n_vectors < 20_000:
+        return "flat"
+    if n_vectors < 200_000:
+        return "hnsw-sq"
+    return "ivfpq"
+
+
+def _index_factory_string(mode, n_vectors, dim):
+    nlist = max(16, min(65536, int(4 * n_vectors ** 0.5)))
+    # Largest sub-quantizer count that divides dim with ≥8 dims per sub-vector
+    pq_m = max(m for m in range(1, dim // 8 + 1) if dim % m == 0)
+    return {
+        "hnsw": "HNSW32",
+        "hnsw-sq": "HNSW32,SQ8",
+        "ivf-sq": f"IVF{nlist},SQ8",
+        "ivfpq": f"IVF{nlist},PQ{pq_m}",
+    }[mode]
+
+
+def build_serving_index(flat_index, mode, train_sample=100_000, seed=0):
+    """Derive a compressed index from an exact flat one, training on a random sample"""
+    import faiss
+    import numpy as np
+
+    n_vectors = flat_index.ntotal
+    vectors = flat_index.reconstruct_n(0, n_vectors)
+    index = faiss.index_factory(flat_index.d, _index_factory_string(mode, n_vectors, flat_index.d), flat_index.metric_type)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n_vectors, size=min(n_vectors, train_sample), replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    _tune_search(index)
+    return index
+
+
+def _tune_search(index):
+    import faiss
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    try:
+        faiss.extract_index_ivf(index).nprobe = int(os.getenv("IVF_NPROBE", "32"))
+    except RuntimeError:
+        pass  # not an IVF index
+
+
+def _docstore_digest(index_to_docstore_id):
+    """Fingerprint of the position -> chunk ID mapping a serving index was built against"""
+    ids = "\n".join(index_to_docstore_id[i] for i in sorted(index_to_docstore_id))
+    return hashlib.sha256(ids.encode("utf-8")).hexdigest()
+
+
+def _write_serving_index(index_dir, vectordb, index_mode=None):
+    """Write serving.faiss into a generation being built, if the index is large enough; return the mode used"""
+    import faiss
+
+    mode = choose_index_mode(vectordb.index.ntotal, index_mode)
+    if mode == "flat":
+        return mode
+    faiss.write_index(build_serving_index(vectordb.index, mode), os.path.join(index_dir, f"{SERVING_INDEX_NAME}.faiss"))
+    with open(os.path.join(index_dir, f"{SERVING_INDEX_NAME}.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "mode": mode,
+            "ntotal": vectordb.index.ntotal,
+            "docstore_digest": _docstore_digest(vectordb.index_to_docstore_id),
+        }, f)
+    return mode
+
+
+def _read_serving_vectorstore(index_dir):
+    """Build a FAISS store around serving.faiss without loading the flat vectors, if it is current.
+
+    Serving copies are only ever written alongside their flat index, so the digest check
+    is a guard against indexes saved by older versions of this module.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    meta_path = os.path.join(index_dir, f"{SERVING_INDEX_NAME}.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(os.path.join(index_dir, f"{INDEX_NAME}.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    if meta.get("docstore_digest") != _docstore_digest(index_to_docstore_id):
+        return None  # stale: the flat index changed after the serving copy was built
+    index_path = os.path.join(index_dir, f"{SERVING_INDEX_NAME}.faiss")
+    try:
+        # IVF inverted lists can be memory-mapped instead of read into RAM
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(index_path)
+    _tune_search(index)
+    return FAISS(
+        embedding_function=get_embedding_engine(),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
+
+
+def load_vectorstore(index_dir):
+    """Load a persisted FAISS index once per process and serve it from the LRU cache"""
+    for attempt in range(2):
+        live_dir, version = _live_index(index_dir)
+        if version is None:
+            return None
+        key = (index_dir, "faiss", version)
+        vectorstore = _cache_get(key)
+        if vectorstore is not None:
+            return vectorstore
+        # Imported on first load: langchain_community + FAISS cost seconds at app start
+        from langchain_community.vectorstores import FAISS
+        try:
+            with get_tracer().span("vectorstore.load"):
+                vectorstore = _read_serving_vectorstore(live_dir) or FAISS.load_local(
+                    live_dir,
+                    get_embedding_engine(),
+                    index_name=INDEX_NAME,
+                    allow_dangerous_deserialization=True  # we only load indexes we wrote ourselves
+                )
+        except (OSError, RuntimeError):
+            if attempt or _index_version(index_dir) == version:
+                raise
+            continue  # two newer saves retired this generation mid-load: resolve CURRENT again
+        _loaded_from[vectorstore] = (live_dir, version)
+        _cache_put(key, vectorstore)
+        return vectorstore
+
 
 def setup_vectorstore(user_specific=False, vector_db_dir=None, user_id=None):
     try:
-        embeddings = HuggingFaceEmbeddings()
-        vectorstore = FAISS(embedding_function=embeddings)
+        index_dir = _index_dir(vector_db_dir, user_id if user_specific else None)
+        vectorstore = load_vectorstore(index_dir)
+        if vectorstore is None:
+            st.session_state.error = "No processed documents found. Please process your documents first."
         return vectorstore
     except Exception as e:
         st.session_state.error = f"Error setting up vector store: {str(e)}"
         return None
 
-def vectorize_data(data_dir, vector_db_dir, user_id, user_files=None):
+
+def load_bm25(index_dir, vectorstore):
+    """Load the BM25 companion of an index, rebuilding it for checkpoints and older indexes without one"""
+    # The generation `vectorstore` came from, even if a newer one has been published since
+    live_dir, version = _loaded_from.get(vectorstore) or _live_index(index_dir)
+    key = (index_dir, "bm25", version)
+    bm25 = _cache_get(key)
+    if bm25 is None:
+        bm25_path = os.path.join(live_dir, BM25_NAME)
+        with get_tracer().span("bm25.load"):
+            if os.path.exists(bm25_path):
+                bm25 = BM25Index.load(bm25_path)
+            else:
+                bm25 = BM25Index.from_vectorstore(vectorstore)
+                try:
+                    bm25.save(bm25_path)
+                except OSError:
+                    pass  # generation already retired; the in-memory copy still serves this version
+        _cache_put(key, bm25)
+    return bm25
+
+
+def shared_index_dir(vector_db_dir):
+    return os.getenv("SHARED_INDEX_DIR") or os.path.join(vector_db_dir, SHARED_INDEX_NAME)
+
+
+def shared_index_available(vector_db_dir):
+    return index_available(shared_index_dir(vector_db_dir))
+
+
+def load_shared_vectorstore(vector_db_dir):
+    """The shared corpus index: loaded (memory-mapped where the index type allows) once per
+    process and pinned in the cache, so per-user churn never evicts it"""
+    index_dir = shared_index_dir(vector_db_dir)
+    with _index_cache_lock:
+        _pinned_dirs.add(index_dir)
+    return load_vectorstore(index_dir)
+
+
+def _hybrid_retriever(index_dir, vectorstore, k, on_error=None):
     try:
-        st.session_state.processing = True
-        user_data_dir = os.path.join(data_dir, user_id)
-        os.makedirs(user_data_dir, exist_ok=True)
-        if user_files:
-            for uploaded_file in user_files:
-                file_bytes = uploaded_file.read()
-                file_path = os.path.join(user_data_dir, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(file_bytes)
-        loader = DirectoryLoader(
-            path=user_data_dir,
-            glob="**/*.pdf",
-            loader_cls=UnstructuredFileLoader
-        )
-        documents = loader.load()
-        if not documents:
-            st.session_state.processing = False
-            return False, "No documents found or could not be processed."
-        text_splitter = CharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-        text_chunks = text_splitter.split_documents(documents)
-        embeddings = HuggingFaceEmbeddings()
-        vectordb = FAISS.from_documents(
-            documents=text_chunks,
-            embedding=embeddings
+        bm25 = load_bm25(index_dir, vectorstore)
+    except Exception as e:
+        if on_error:
+            on_error(f"Keyword index unavailable, using vector search only: {str(e)}")
+        bm25 = None
+    return HybridRetriever(
+        vectorstore,
+        bm25,
+        k=k,
+        candidates=int(os.getenv("RETRIEVAL_CANDIDATES", "20")),
+        rerank=os.getenv("RETRIEVAL_RERANK", "0") == "1",
+        rerank_top_n=int(os.getenv("RETRIEVAL_RERANK_TOP_N", "10")),
+        latency_budget_ms=float(os.getenv("RETRIEVAL_BUDGET_MS", "500"))
+    )
+
+
+def build_retriever(vector_db_dir, user_id=None, k=3, include_shared=True, on_error=None):
+    """Retriever over a user's index (merged with the shared corpus when it has been built),
+    or over vector_db_dir itself when user_id is None. Returns None when there is nothing to
+    search; problems are reported through on_error(message)."""
+    index_dir = _index_dir(vector_db_dir, user_id)
+    shared = None
+    if user_id and include_shared:
+        shared_store = load_shared_vectorstore(vector_db_dir)
+        if shared_store is not None:
+            shared = _hybrid_retriever(shared_index_dir(vector_db_dir), shared_store, k, on_error)
+            if _index_version(index_dir) is None:
+                return shared  # nothing uploaded yet: the shared corpus alone
+
+    try:
+        vectorstore = load_vectorstore(index_dir)
+    except Exception as e:
+        if on_error:
+            on_error(f"Error setting up vector store: {str(e)}")
+        return shared
+    if vectorstore is None:
+        if shared is None and on_error:
+            on_error("No processed documents found. Please process your documents first.")
+        return shared
+    private = _hybrid_retriever(index_dir, vectorstore, k, on_error)
+    if shared is None:
+        return private
+    return MergedRetriever([("private", private), ("shared", shared)], k=k)
+
+
+def _report_error(message):
+    st.session_state.error = message
+
+
+def setup_retriever(user_specific=False, vector_db_dir=None, user_id=None, k=3, include_shared=True):
+    """Hybrid BM25 + dense retriever over a persisted index; knobs come from RETRIEVAL_* env vars.
+
+    For a user-specific retriever the shared corpus is searched too (when it has been built)
+    and both result lists are merged by score. With RETRIEVAL_SERVICE_URL set, searches go
+    to the retrieval service instead of indexes loaded in this process.
+    """
+    if retrieval_service_url():
+        return RemoteRetriever(
+            get_retrieval_client(),
+            user_id if user_specific else None,
+            k=k,
+            include_shared=include_shared,
+            on_error=_report_error
         )
+    return build_retriever(
+        vector_db_dir,
+        user_id if user_specific else None,
+        k=k,
+        include_shared=include_shared,
+        on_error=_report_error
+    )
+
+
+# --- Retrieval service client ---
+# Several Streamlit workers can share one process that holds the embedding model and the
+# indexes (python -m legal.retrieval_service). RETRIEVAL_SERVICE_URL is http://host:port
+# or unix:///path/to/socket; connections are kept alive and pooled per worker.
+def retrieval_service_url():
+    return os.getenv("RETRIEVAL_SERVICE_URL") or None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RetrievalServiceClient:
+    """Thread-safe client with a small pool of keep-alive connections"""
+
+    def __init__(self, url, pool_size=8, timeout=30.0):
+        self.url = url
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self):
+        if self.url.startswith("unix://"):
+            return _UnixHTTPConnection(self.url[len("unix://"):], self.timeout)
+        parsed = urllib.parse.urlparse(self.url)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+
+    def _request(self, path, payload, retry=True):
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self._new_connection()
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            if retry:
+                # A pooled connection the server already closed: one retry on a fresh one
+                return self._request(path, payload, retry=False)
+            raise
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error {response.status}: {data.get('error', '')}")
+        return data
+
+    def search(self, user_id, query, k=3, include_shared=True):
+        return self._request("/search", {"user_id": user_id, "query": query, "k": k, "include_shared": include_shared})
+
+    def search_batch(self, requests):
+        return self._request("/search_batch", {"requests": requests})["results"]
+
+    def evict(self, user_id):
+        return self._request("/evict", {"user_id": user_id})
+
+
+class RemoteRetriever:
+    """Same interface as HybridRetriever, answered by the retrieval service"""
+
+    def __init__(self, client, user_id, k=3, include_shared=True, on_error=None):
+        self.client = client
+        self.user_id = user_id
+        self.k = k
+        self.include_shared = include_shared
+        self.on_error = on_error
+        self.last_timings = {}
+
+    def get_relevant_documents(self, query):
+        with get_tracer().span("retrieval.remote"):
+            result = self.client.search(self.user_id, query, self.k, self.include_shared)
+        if result.get("error") and self.on_error:
+            self.on_error(result["error"])
+        self.last_timings = result.get("timings", {})
+        return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in result["documents"]]
+
+    def invoke(self, query):
+        return self.get_relevant_documents(query)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_retrieval_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = RetrievalServiceClient(
+                    retrieval_service_url(),
+                    pool_size=int(os.getenv("RETRIEVAL_SERVICE_POOL", "8")),
+                    timeout=float(os.getenv("RETRIEVAL_SERVICE_TIMEOUT", "30"))
+                )
+    return _client
+
+
+def _load_for_update(index_dir):
+    """Load a private copy of an index for mutation so cached readers are never disturbed"""
+    live_dir = live_index_dir(index_dir)
+    if live_dir is None:
+        return None
+    from langchain_community.vectorstores import FAISS
+    return FAISS.load_local(
+        live_dir,
+        get_embedding_engine(),
+        index_name=INDEX_NAME,
+        allow_dangerous_deserialization=True
+    )
+
+
+def save_user_documents(data_dir, user_id, user_files):
+    """Write uploaded files to data/<user_id> so an ingestion run can pick them up"""
+    user_data_dir = os.path.join(data_dir, user_id)
+    os.makedirs(user_data_dir, exist_ok=True)
+    for uploaded_file in user_files or []:
+        file_bytes = uploaded_file.read()
+        file_path = os.path.join(user_data_dir, uploaded_file.name)
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+
+
+def ingest_directory(
+    source_dir,
+    index_dir,
+    text_splitter=None,
+    progress=None,
+    should_cancel=None,
+    parse_pool=None,
+    checkpoint_every=8,
+    recursive=True,
+    skip_dir=None,
+    index_mode=None
+):
+    """Bring the index in index_dir up to date with the files in source_dir; safe to call off the script thread.
+
+    progress(files_parsed, files_total, chunks_embedded) is called as work advances.
+    should_cancel() is polled between batches. Every `checkpoint_every` batches the flat
+    index and manifest are saved, with half-ingested files recorded without a hash so an
+    interrupted run (cancel or crash) resumes from the last checkpoint.
+    skip_dir(name) leaves matching subdirectories out of a recursive walk.
+    Returns (success, message).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    # The manifest lives in the generation it describes, so a crash between saves can't pair them wrongly
+    manifest = load_manifest(live_index_dir(index_dir) or index_dir)
+    current_hashes = hash_files(source_dir, SUPPORTED_EXTENSIONS, recursive=recursive, skip_dir=skip_dir)
+    to_ingest, unchanged, removed = diff_manifest(manifest, current_hashes)
+    if not current_hashes:
+        if removed:
+            # Every source file is gone: so is the index, or deleted documents stay retrievable
+            _remove_index_files(index_dir)
+            _evict_cached(index_dir)
+            return False, f"No documents found; {len(removed)} removed file(s) were dropped from the index."
+        return False, "No documents found or could not be processed."
+    if not to_ingest and not removed:
+        return True, "Documents already up to date."
+
+    vectordb = _load_for_update(index_dir)
+    # Changed files are re-ingested, so their old vectors go the same way as deleted files'
+    stale_ids = [
+        chunk_id
+        for path in removed + [p for p in to_ingest if p in manifest]
+        for chunk_id in manifest[path]["chunk_ids"]
+    ]
+    if vectordb is not None and stale_ids:
+        vectordb.delete(stale_ids)
+    for path in removed:
+        del manifest[path]
+
+    for path in to_ingest:
+        # No hash until every chunk is in: a checkpoint taken mid-file must not mark it done
+        manifest[path] = {"hash": None, "chunk_ids": []}
+    counts = {"parsed": 0, "chunks": 0}
+
+    def report():
+        if progress:
+            progress(counts["parsed"], len(to_ingest), counts["chunks"])
+
+    def on_parsed(path, error):
+        counts["parsed"] += 1
+        report()
+
+    def on_done(path):
+        manifest[path]["hash"] = current_hashes[path]
+
+    def checkpoint():
+        if vectordb is not None:
+            # Flat index only: the serving copy and BM25 are rebuilt at the end of the run
+            finished = {p: e for p, e in manifest.items() if p not in errors}
+
+            def write_checkpoint(tmp_dir):
+                vectordb.save_local(tmp_dir, index_name=INDEX_NAME)
+                save_manifest(tmp_dir, finished)
+
+            _publish(index_dir, write_checkpoint)
+
+    text_splitter = text_splitter or LegalTextSplitter(chunk_size=1500)
+    errors = {}
+    batches = iter_chunk_batches(
+        source_dir,
+        to_ingest,
+        text_splitter,
+        errors=errors,
+        pool=parse_pool,
+        on_parsed=on_parsed,
+        on_done=on_done
+    )
+    for batch_number, batch in enumerate(batches, start=1):
+        text_chunks = [chunk for _, chunk in batch]
+        chunk_ids = [str(uuid.uuid4()) for _ in batch]
+        if vectordb is None:
+            vectordb = FAISS.from_documents(
+                documents=text_chunks,
+                embedding=get_embedding_engine(),
+                ids=chunk_ids
+            )
+        else:
+            vectordb.add_documents(text_chunks, ids=chunk_ids)
+        for (path, _), chunk_id in zip(batch, chunk_ids):
+            manifest[path]["chunk_ids"].append(chunk_id)
+        counts["chunks"] += len(batch)
+        report()
+        if should_cancel and should_cancel():
+            batches.close()
+            checkpoint()
+            return False, "Processing cancelled; finished files were kept and the rest will resume next time."
+        if checkpoint_every and batch_number % checkpoint_every == 0:
+            checkpoint()
+    # Leave failed files out of the manifest so the next run retries them
+    for path in errors:
+        del manifest[path]
+
+    if vectordb is None:
+        return False, "No documents found or could not be processed."
+    # Rebuilt from the docstore each run: tokenizing is cheap next to embedding
+    bm25 = BM25Index.from_vectorstore(vectordb)
+    serving_modes = []
+
+    def write_generation(tmp_dir):
+        vectordb.save_local(tmp_dir, index_name=INDEX_NAME)
+        serving_modes.append(_write_serving_index(tmp_dir, vectordb, index_mode))
+        bm25.save(os.path.join(tmp_dir, BM25_NAME))
+        save_manifest(tmp_dir, manifest)
+
+    version = _publish(index_dir, write_generation)
+    # Warm the cache with the index we just built so the first query skips the disk load
+    if serving_modes[0] == "flat":
+        _loaded_from[vectordb] = (os.path.join(index_dir, version), version)
+        _cache_put((index_dir, "faiss", version), vectordb)
+    _cache_put((index_dir, "bm25", version), bm25)
+    return True, (
+        f"Documents successfully vectorized! "
+        f"({len(to_ingest) - len(errors)} processed, {len(unchanged)} unchanged, {len(removed)} removed"
+        + (f", {len(errors)} failed: {', '.join(sorted(errors))}" if errors else "")
+        + ")"
+    )
+
+
+def ingest_documents(data_dir, vector_db_dir, user_id, **kwargs):
+    """Bring vector_db_dir/<user_id> up to date with data/<user_id> (see ingest_directory)"""
+    return ingest_directory(os.path.join(data_dir, user_id), _index_dir(vector_db_dir, user_id), **kwargs)
+
+
+def vectorize_data(data_dir, vector_db_dir, user_id, user_files=None, text_splitter=None):
+    try:
+        st.session_state.processing = True
+        save_user_documents(data_dir, user_id, user_files)
+        success, message = ingest_documents(data_dir, vector_db_dir, user_id, text_splitter=text_splitter)
         st.session_state.processing = False
-        st.session_state.documents_vectorized = True
-        return True, "Documents successfully vectorized!"
+        if success:
+            st.session_state.documents_vectorized = True
+        return success, message
     except Exception as e:
         st.session_state.processing = False
         return False, f"Error vectorizing documents: {str(e)}"
@@ -0,0 +1,93 @@
+# Deferred loading of the heavy stacks (FAISS, embedding model, Unstructured, Gemini SDK).
+# Nothing here runs at import time; the app calls start_background_warmup() after its first render.
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+def _load_faiss():
+    import faiss  # noqa: F401
+    from langchain_community.vectorstores import FAISS  # noqa: F401
+
+
+def _load_embeddings():
+    from legal.embeddings import get_embedding_engine
+    get_embedding_engine().warm_up()
+
+
+def _load_unstructured():
+    # Parsing happens in the ingest process pool when it is enabled; this warms the
+    # in-process path and the shared loader modules, not the pool's workers
+    from langchain_community.document_loaders import UnstructuredFileLoader  # noqa: F401
+    from unstructured.partition.auto import partition  # noqa: F401
+
+
+def _load_gemini():
+    from legal.gemini import warm_up_model
+    warm_up_model()
+
+
+COMPONENTS = {
+    "faiss": _load_faiss,
+    "embeddings": _load_embeddings,
+    "gemini": _load_gemini,
+    "unstructured": _load_unstructured,
+}
+# Query path first: a user who types a question right away needs FAISS and the encoder
+DEFAULT_ORDER = ("faiss", "embeddings", "gemini", "unstructured")
+
+_status: Dict[str, dict] = {}
+_status_lock = threading.Lock()
+
+
+def ensure_loaded(name: str) -> float:
+    """Load one component if it isn't already; returns the seconds spent (0 when cached)"""
+    with _status_lock:
+        entry = _status.setdefault(name, {"state": "pending", "seconds": 0.0, "error": None, "lock": threading.Lock()})
+    with entry["lock"]:
+        if entry["state"] == "ready":
+            return 0.0
+        started = time.perf_counter()
+        try:
+            COMPONENTS[name]()
+        except Exception as e:
+            # A missing optional stack (e.g. no Unstructured) only matters once it's used
+            entry.update(state="failed", error=str(e))
+            return time.perf_counter() - started
+        entry.update(state="ready", seconds=time.perf_counter() - started, error=None)
+        return entry["seconds"]
+
+
+def warm_up(components: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """Load components in order and return seconds spent per component"""
+    return {name: ensure_loaded(name) for name in (DEFAULT_ORDER if components is None else components)}
+
+
+def warmup_status() -> Dict[str, dict]:
+    with _status_lock:
+        return {name: {k: v for k, v in entry.items() if k != "lock"} for name, entry in _status.items()}
+
+
+# --- Background warm-up (once per process) ---
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def start_background_warmup(components: Optional[Iterable[str]] = None) -> Optional[threading.Thread]:
+    """Start the warm-up thread unless WARMUP_ON_START=0; later calls return the same thread"""
+    global _thread
+    if os.getenv("WARMUP_ON_START", "1") != "1":
+        return None
+    with _thread_lock:
+        if _thread is None:
+            names = list(components or os.getenv("WARMUP_COMPONENTS", ",".join(DEFAULT_ORDER)).split(","))
+            _thread = threading.Thread(
+                target=warm_up,
+                args=([name.strip() for name in names if name.strip() in COMPONENTS],),
+                name="warmup",
+                daemon=True
+            )
+            _thread.start()
+    return _thread
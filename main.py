@@ -1,5 +1,4 @@
 import os
-import time
 import uuid
 import streamlit as st
 from dotenv import load_dotenv
@@ -13,21 +12,24 @@ st.set_page_config(
 )
 
 # --- Imports ---
-from ui.chat import display_chat_history
-from ui.faq import display_faq
-from legal.vectorstore import setup_vectorstore, vectorize_data
-from legal.gemini import gemini_chat
+from ui.chat import add_chat_message, display_chat_history, render_chat_message, render_streaming_response
+from ui.faq import display_faq, prewarm_faq_answers
+from legal.vectorstore import setup_retriever, save_user_documents, evict_vectorstore, index_available, shared_index_available
+from legal.jobs import get_job_manager
+from legal.tracing import get_tracer, start_metrics_server
+from legal.warmup import start_background_warmup
+from legal.gemini import gemini_chat_stream, get_gemini
+from legal.context import pack_context
+from legal.memory import new_conversation_memory
 from legal.utils import generate_hash
 
 # --- Load environment variables ---
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if not GEMINI_API_KEY and os.getenv("GEMINI_BACKEND", "gemini") != "stub":
     st.error("⚠️ GEMINI_API_KEY not found. Please add it to your .env file.")
     st.stop()
-
-import google.generativeai as genai
-genai.configure(api_key=GEMINI_API_KEY)
+# legal.gemini configures the SDK (or the local stub) on import
 
 # --- Path Setup ---
 working_dir = os.path.dirname(os.path.abspath(__file__))
@@ -35,25 +37,45 @@ data_dir = os.path.join(working_dir, "data")
 os.makedirs(data_dir, exist_ok=True)
 vector_db_dir = os.path.join(working_dir, "vector_db_dir")
 os.makedirs(vector_db_dir, exist_ok=True)
+os.environ.setdefault("PDF_PAGE_CACHE", os.path.join(vector_db_dir, "pdf_pages.sqlite3"))
+job_manager = get_job_manager(os.path.join(vector_db_dir, "jobs.sqlite3"))
+
+# --- Tracing / metrics (Prometheus text on METRICS_PORT, per-request JSONL via TRACE_JSONL) ---
+tracer = get_tracer()
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
 
 # --- Session State Initialization ---
 if "user_id" not in st.session_state:
-    st.session_state.user_id = str(uuid.uuid4())
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    # The user ID names the user's directories under data/ and vector_db_dir/, so it never
+    # leaves the server. While ingestion runs the URL carries the job ID instead, and a
+    # refresh finds the user again through it; the link stops working once the job ends.
+    job = job_manager.reconnect(st.query_params.get("job"))
+    st.session_state.user_id = job["user_id"] if job else str(uuid.uuid4())
+    if job is None:
+        st.query_params.pop("job", None)
+    st.query_params.pop("uid", None)  # left in bookmarks by older versions, which put the user ID there
+if "memory" not in st.session_state:
+    st.session_state.memory = new_conversation_memory()
 if "documents_vectorized" not in st.session_state:
     st.session_state.documents_vectorized = False
 if "processing" not in st.session_state:
     st.session_state.processing = False
 if "error" not in st.session_state:
     st.session_state.error = None
-if "last_request_time" not in st.session_state:
-    st.session_state.last_request_time = 0
+if "ingest_job_id" not in st.session_state:
+    latest_job = job_manager.store.latest_for_user(st.session_state.user_id)
+    active_job = latest_job and latest_job["status"] in ("queued", "running")
+    st.session_state.ingest_job_id = latest_job["id"] if active_job else None
+    st.session_state.processing = bool(active_job)
+    st.session_state.documents_vectorized = index_available(vector_db_dir, st.session_state.user_id)
 if "current_model" not in st.session_state:
-    st.session_state.current_model = "gemini-2.0-flash"
+    st.session_state.current_model = get_gemini().router.primary_model
 
-FALLBACK_MODEL = "gemini-1.0-pro"
-REQUEST_DELAY = 1.2  # seconds between requests
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "8"))  # candidates handed to the context packer
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))  # summary + recent turns sent to Gemini
+CHAT_DISPLAY_LIMIT = int(os.getenv("CHAT_DISPLAY_LIMIT", "20"))
 
 # --- Custom CSS ---
 with open(os.path.join(working_dir, "assets", "style.css"), "r") as css_file:
@@ -124,24 +146,17 @@ with process_col1:
             if total_size > 50 * 1024 * 1024:  # 50MB limit
                 st.error("Total size exceeds 50MB limit")
             else:
-                st.session_state.processing = True
                 try:
-                    with st.spinner("Analyzing documents with AI..."):
-                        success, message = vectorize_data(
-                            data_dir, 
-                            vector_db_dir, 
-                            st.session_state.user_id, 
-                            uploaded_files
-                        )
-                        if success:
-                            st.session_state.documents_vectorized = True
-                            st.toast("✅ Documents processed successfully!", icon="✅")
-                        else:
-                            st.error(f"❌ {message}")
+                    # Only the upload is saved here; parsing and embedding run as a background job
+                    save_user_documents(data_dir, st.session_state.user_id, uploaded_files)
+                    st.session_state.ingest_job_id = job_manager.submit(
+                        st.session_state.user_id, data_dir, vector_db_dir
+                    )
+                    st.session_state.processing = True
+                    st.query_params["job"] = st.session_state.ingest_job_id
+                    st.rerun()
                 except Exception as e:
                     st.error(f"Processing failed: {str(e)}")
-                finally:
-                    st.session_state.processing = False
         else:
             st.warning("Please upload documents first")
 with process_col2:
@@ -156,74 +171,108 @@ with process_col2:
             if os.path.exists(user_vector_dir):
                 import shutil
                 shutil.rmtree(user_vector_dir)
+            evict_vectorstore(vector_db_dir, st.session_state.user_id)
             
             st.session_state.documents_vectorized = False
             st.toast("🗑️ Documents cleared successfully!", icon="🗑️")
         except Exception as e:
             st.error(f"Error clearing documents: {str(e)}")
 
+# --- Ingestion Job Status (polled while a job is active) ---
+@st.fragment(run_every=2)
+def ingestion_status():
+    job_id = st.session_state.get("ingest_job_id")
+    if not job_id:
+        return
+    job = job_manager.status(job_id)
+    if job is None:
+        st.session_state.ingest_job_id = None
+        st.query_params.pop("job", None)
+        return
+    if job["status"] in ("queued", "running"):
+        files_total = max(job["files_total"], 1)
+        st.progress(
+            min(job["files_parsed"] / files_total, 1.0),
+            text=f"Analyzing documents… {job['files_parsed']}/{job['files_total']} files parsed, "
+                 f"{job['chunks_embedded']} chunks embedded" if job["status"] == "running" else "Waiting in queue…"
+        )
+        if st.button("✋ Cancel Processing", disabled=bool(job["cancel_requested"])):
+            job_manager.cancel(job_id)
+        return
+
+    st.session_state.ingest_job_id = None
+    st.session_state.processing = False
+    st.query_params.pop("job", None)
+    if job["status"] == "done":
+        st.session_state.documents_vectorized = True
+        st.toast("✅ Documents processed successfully!", icon="✅")
+    elif job["status"] == "cancelled":
+        st.warning(job["message"])
+    else:
+        st.error(f"❌ {job['message']}")
+    st.rerun()
+
+ingestion_status()
+
 # --- Chat Interface ---
 st.markdown("### 💬 Ask Vaakeel Saab")
 chat_container = st.container()
+memory = st.session_state.memory
 with chat_container:
-    display_chat_history()
+    display_chat_history(memory, limit=CHAT_DISPLAY_LIMIT)
 
 user_query = st.chat_input("Type your legal question here...")
 if user_query:
-    current_time = time.time()
-    time_since_last = current_time - st.session_state.last_request_time
-    if time_since_last < REQUEST_DELAY:
-        time.sleep(REQUEST_DELAY - time_since_last)
-    st.session_state.last_request_time = time.time()
-
-    st.session_state.chat_history.append({"role": "user", "content": user_query})
+    # Only the new question is drawn; the history above is already on the page
+    add_chat_message(memory, "user", user_query)
     with chat_container:
-        display_chat_history()
+        render_chat_message("user", user_query)
 
-    context = None
-    if st.session_state.documents_vectorized:
-        try:
-            vectorstore = setup_vectorstore(
-                user_specific=True,
-                vector_db_dir=vector_db_dir,
-                user_id=st.session_state.user_id
-            )
-            if vectorstore:
-                retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-                docs = retriever.get_relevant_documents(user_query)
+    with tracer.request(st.session_state.user_id):
+        history = memory.prompt_history(HISTORY_TOKEN_BUDGET)
+        context = None
+        # The shared corpus (built by vectorize_documents.py) is searched even before any upload
+        if st.session_state.documents_vectorized or shared_index_available(vector_db_dir):
+            try:
+                with tracer.span("rag.retrieve"):
+                    retriever = setup_retriever(
+                        user_specific=True,
+                        vector_db_dir=vector_db_dir,
+                        user_id=st.session_state.user_id,
+                        k=RETRIEVAL_K
+                    )
+                    docs = retriever.get_relevant_documents(user_query) if retriever else []
                 if docs:
-                    context = "\n\n".join([
-                        f"📄 Document Excerpt {i+1}:\n{doc.page_content[:2000]}..." 
-                        for i, doc in enumerate(docs)
-                    ])
-        except Exception as e:
-            st.error(f"Document retrieval error: {str(e)}")
+                    with tracer.span("rag.pack_context"):
+                        context, context_stats = pack_context(docs, token_budget=CONTEXT_TOKEN_BUDGET)
+                    st.session_state.last_context_stats = context_stats
+                    with chat_container:
+                        st.caption(
+                            f"📚 {context_stats['excerpts']} excerpts · "
+                            f"~{context_stats['packed_tokens']} of {CONTEXT_TOKEN_BUDGET} context tokens"
+                        )
+            except Exception as e:
+                tracer.incr("retrieval_errors")
+                st.error(f"Document retrieval error: {str(e)}")
 
-    try:
-        with st.status(f"Analyzing with {st.session_state.current_model}...", expanded=True) as status:
-            try:
-                ai_response = gemini_chat(
-                    user_query,
-                    context=context
+        try:
+            with chat_container, tracer.span("rag.generate"):
+                # Stream tokens straight into the chat so the first words show up immediately
+                ai_response = render_streaming_response(
+                    gemini_chat_stream(user_query, context=context, history=history)
                 )
-                status.update(label="Analysis Complete", state="complete", expanded=False)
-            except Exception as e:
-                if "quota" in str(e).lower():
-                    st.session_state.current_model = FALLBACK_MODEL
-                    st.warning(f"Switched to {FALLBACK_MODEL} due to API limits")
-                    ai_response = gemini_chat(
-                        user_query,
-                        context=context
-                    )
-                else:
-                    ai_response = f"⚠️ System Error: {str(e)}"
-                status.update(label="Completed with warnings", state="error")
-    except Exception as e:
-        ai_response = f"⚠️ Processing Error: {str(e)}"
+            # The router may have answered from a fallback or hedged model
+            st.session_state.current_model = get_gemini().last_model or st.session_state.current_model
+        except Exception as e:
+            ai_response = f"⚠️ Processing Error: {str(e)}"
+            with chat_container:
+                render_streaming_response([ai_response])
 
-    st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
-    with chat_container:
-        display_chat_history()
+    add_chat_message(memory, "assistant", ai_response)
+    if not ai_response.startswith(("⚠️", "❌")):
+        # Any summary call runs on the summarizer thread, so the FAQ and footer render right away
+        with tracer.span("memory.update"):
+            memory.add_turn(user_query, ai_response)
 
 # --- FAQ Section ---
 st.markdown("<div id='faq-section'></div>", unsafe_allow_html=True)
@@ -253,3 +302,19 @@ st.markdown("""
     </div>
 </div>
 """, unsafe_allow_html=True)
+
+# --- Background Warm-up (once per process, after the first page has rendered) ---
+# FAISS, the embedding model, the Gemini SDK and Unstructured all load on first use;
+# these threads just make sure that first use isn't a user's first question.
+@st.cache_resource
+def start_background_work():
+    start_background_warmup()
+    # FAQ prewarming spends paid Gemini calls, so by default ("auto") it only runs when the
+    # answers survive a restart in the SQLite cache tier; PREWARM_FAQ=1 forces it, 0 disables it
+    prewarm_faq = os.getenv("PREWARM_FAQ", "auto")
+    if prewarm_faq == "1" or (prewarm_faq == "auto" and os.getenv("GEMINI_CACHE_DB")):
+        import threading
+        threading.Thread(target=prewarm_faq_answers, daemon=True).start()
+    return True
+
+start_background_work()
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document  # noqa: E402
+from legal.chunking import FOOTNOTE, SECTION, LegalTextSplitter, classify_line  # noqa: E402
+
+# The footnote that introduces Article 21A in the Constitution of India
+FOOTNOTE_LINE = "1. Ins. by the Constitution (Eighty-sixth Amendment) Act, 2002, s. 2 (w.e.f. 1-4-2010).\n"
+
+
+def test_editorial_footnotes_are_not_sections():
+    assert classify_line(FOOTNOTE_LINE) == (FOOTNOTE, "1")
+    assert classify_line("5. Subs. by the Constitution (Seventh Amendment) Act, 1956, s. 29 and Sch.\n")[0] == FOOTNOTE
+    assert classify_line("21. Protection of life and personal liberty.—No person shall be deprived\n") == (SECTION, "21")
+
+
+def test_footnote_block_keeps_section_across_pages():
+    page_one = (
+        "3. Formation of new States and alteration of areas, boundaries or names of existing States.—"
+        + "Parliament may by law form a new State. " * 10 + "\n"
+        + FOOTNOTE_LINE
+        + "2. Subs. by the Constitution (Seventh Amendment) Act, 1956, s. 29 and Sch.\n"
+    )
+    page_two = "Explanation II.—The power conferred on Parliament by clause (a) includes the power to form a new State.\n"
+    chunks = LegalTextSplitter().split_documents([
+        Document(page_content=page_one, metadata={"source": "coi.pdf", "page_number": 1}),
+        Document(page_content=page_two, metadata={"source": "coi.pdf", "page_number": 2}),
+    ])
+    assert [chunk.metadata["section_id"] for chunk in chunks] == ["3", "3"]
+
+
+def test_heading_fragments_lead_the_next_chunk():
+    text = (
+        "PART V\nTHE UNION\nCHAPTER I.—THE EXECUTIVE\n"
+        "52. The President of India.—There shall be a President of India.\n"
+    )
+    chunks = LegalTextSplitter().split_documents([Document(page_content=text, metadata={"source": "coi.pdf"})])
+    assert len(chunks) == 1
+    assert chunks[0].page_content.startswith("PART V\nTHE UNION")
+    assert chunks[0].metadata["section_id"] == "52"
+
+
+def test_chunk_opening_with_carried_fragment_has_no_offset():
+    page_one = "36. Definition.—In this Part, unless the context otherwise requires, the State has the same meaning.\nPART IV\n"
+    page_two = "37. Application of the principles contained in this Part.—The provisions contained in this Part.\n"
+    chunks = LegalTextSplitter(min_chunk_size=50).split_documents([
+        Document(page_content=page_one, metadata={"source": "coi.pdf", "page_number": 1}),
+        Document(page_content=page_two, metadata={"source": "coi.pdf", "page_number": 2}),
+    ])
+    carried = [chunk for chunk in chunks if chunk.page_content.startswith("PART IV")]
+    assert carried and carried[0].metadata["start_index"] is None
+    for chunk in chunks:
+        start = chunk.metadata["start_index"]
+        if start is not None:
+            page = page_one if chunk.metadata["page_number"] == 1 else page_two
+            assert page[start:start + len(chunk.page_content)] == chunk.page_content
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document  # noqa: E402
+from legal.context import pack_context  # noqa: E402
+
+
+def _chunk(text, start, corpus=None, score=1.0):
+    metadata = {"source": "coi.pdf", "page_number": 2, "start_index": start, "score": score}
+    if corpus:
+        metadata["corpus"] = corpus
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_overlapping_chunks_merge_once():
+    first = "36. Definition.—In this Part, the State has the same meaning."
+    second = "the same meaning.\n37. Application of the principles contained in this Part."
+    context, stats = pack_context([_chunk(first, 0), _chunk(second, first.index("the same"))])
+    assert stats["excerpts"] == 1
+    assert "the same meaning.\n37. Application" in context
+    assert context.count("the same meaning.") == 1
+
+
+def test_wrong_offsets_never_drop_text():
+    # The first chunk's start_index is off by a fragment carried from page 1 ("PART IV"),
+    # so its offset-computed end runs into the next chunk
+    first = "PART IV\n36. Definition.—In this Part, the State has the same meaning."
+    second = "37. Application of the principles contained in this Part.—The provisions"
+    context, _ = pack_context([_chunk(first, 0), _chunk(second, len(first) - len("PART IV\n"))])
+    assert "37. Application" in context
+    assert "meaning.plication" not in context
+
+
+def test_private_and_shared_chunks_are_not_merged():
+    text = "21. Protection of life and personal liberty.—No person shall be deprived of his life."
+    context, stats = pack_context([
+        _chunk(text, 0, corpus="private"),
+        _chunk(text[:40] + " and more", 0, corpus="shared", score=0.5),
+    ])
+    assert stats["excerpts"] == 2
@@ -2,18 +2,45 @@
 
 import streamlit as st
 
-def display_chat_history():
-    """Display the conversation history"""
-    for i, message in enumerate(st.session_state.chat_history):
-        if message["role"] == "user":
-            st.markdown(f"""
+def _message_html(role, content):
+    if role == "user":
+        return f"""
             <div class="user-message">
-                <strong>You:</strong><br>{message["content"]}
+                <strong>You:</strong><br>{content}
             </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
+            """
+    return f"""
             <div class="ai-message">
-                <strong>Vaakeel Saab:</strong><br>{message["content"]}
+                <strong>Vaakeel Saab:</strong><br>{content}
             </div>
-            """, unsafe_allow_html=True)
\ No newline at end of file
+            """
+
+def add_chat_message(memory, role, content):
+    """Append a message to the session transcript, rendering its HTML once"""
+    memory.add_message(role, content, _message_html(role, content))
+
+def render_chat_message(role, content):
+    """Render a single message (e.g. the question just asked) without repainting the history"""
+    st.markdown(_message_html(role, content), unsafe_allow_html=True)
+
+def display_chat_history(memory, limit=20):
+    """Display the latest messages as one element; older ones load on request"""
+    show_all = st.session_state.get("show_full_history", False)
+    messages = memory.visible_messages(None if show_all else limit)
+    hidden = len(memory.messages) - len(messages)
+    if hidden and st.button(f"⬆️ Show {hidden} earlier messages", key="show_full_history_btn"):
+        st.session_state.show_full_history = True
+        st.rerun()
+    if messages:
+        st.markdown("".join(message["html"] for message in messages), unsafe_allow_html=True)
+
+def render_streaming_response(chunks):
+    """Render an assistant reply as chunks arrive and return the assembled text"""
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(_message_html("assistant", text + " ▌"), unsafe_allow_html=True)
+    text = text.strip()
+    placeholder.markdown(_message_html("assistant", text), unsafe_allow_html=True)
+    return text
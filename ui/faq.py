@@ -1,17 +1,23 @@
 # FAQ section logic will go here.
 
 import streamlit as st
-from legal.gemini import gemini_chat
+from legal.gemini import gemini_chat, get_gemini
+
+FAQ_DATA = [
+    {"question": "How to file an FIR in India?", "category": "Criminal Procedure"},
+    {"question": "What are my fundamental rights as an Indian citizen?", "category": "Constitutional Law"},
+    {"question": "What is the process for filing a consumer complaint?", "category": "Consumer Law"},
+    {"question": "How to respond to a legal notice?", "category": "Civil Procedure"},
+    {"question": "What are tenant rights in India?", "category": "Property Law"},
+    {"question": "How to apply for legal aid in India?", "category": "Legal Services"}
+]
+
+def prewarm_faq_answers():
+    """Populate the response cache with the static FAQ answers"""
+    get_gemini().prewarm((faq["question"] for faq in FAQ_DATA), hint="faq")
 
 def display_faq():
-    faq_data = [
-        {"question": "How to file an FIR in India?", "category": "Criminal Procedure"},
-        {"question": "What are my fundamental rights as an Indian citizen?", "category": "Constitutional Law"},
-        {"question": "What is the process for filing a consumer complaint?", "category": "Consumer Law"},
-        {"question": "How to respond to a legal notice?", "category": "Civil Procedure"},
-        {"question": "What are tenant rights in India?", "category": "Property Law"},
-        {"question": "How to apply for legal aid in India?", "category": "Legal Services"}
-    ]
+    faq_data = FAQ_DATA
     faq_cols = st.columns(3)
     for i, faq in enumerate(faq_data):
         with faq_cols[i % 3]:
@@ -22,7 +28,7 @@ def display_faq():
             </div>
             """, unsafe_allow_html=True)
             if st.button(f"Answer", key=f"faq_btn_{i}", help=f"Get answer to: {faq['question']}"):
-                faq_answer = gemini_chat(faq["question"])
+                faq_answer = gemini_chat(faq["question"], hint="faq")
                 st.markdown(f"""
                 <div class=\"ai-message\">
                     <strong>Question:</strong> {faq['question']}<br><br>
@@ -1,26 +1,83 @@
-from langchain_community.document_loaders import UnstructuredFileLoader
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+"""Build the shared corpus index (bare acts, landmark judgments) that every user searches.
 
-# loaidng the embedding model
-embeddings = HuggingFaceEmbeddings()
+Usage:
+    python vectorize_documents.py [--data-dir data] [--vector-db-dir vector_db_dir] [--workers 4]
 
-loader = DirectoryLoader(path="data",
-                         glob="./*.pdf",
-                         loader_cls=UnstructuredFileLoader)
-documents = loader.load()
+Top-level files in --data-dir are indexed into <vector-db-dir>/_shared (or SHARED_INDEX_DIR).
+--recursive also indexes subdirectories, except the UUID-named data/<user_id>/ folders
+that hold users' private uploads: those never reach the shared corpus.
+Re-running is incremental: unchanged files are skipped, and an interrupted build resumes
+from its last checkpoint. The app only ever reads this index.
+"""
 
+import argparse
+import os
+import sys
+import time
+import uuid
+from legal.chunking import LegalTextSplitter
+from legal.ingest import default_parse_workers, new_parse_pool
+from legal.vectorstore import INDEX_MODES, ingest_directory, shared_index_dir
 
-text_splitter = CharacterTextSplitter(chunk_size=2000,
-                                      chunk_overlap=500)
-text_chunks = text_splitter.split_documents(documents)
 
-vectordb = Chroma.from_documents(
-    documents=text_chunks,
-    embedding=embeddings,
-    persist_directory="vector_db_dir"
-)
+def is_user_dir(name):
+    """True for data/<user_id>/ folders, which the app names with a UUID"""
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return True
 
-print("Documents Vectorized")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--vector-db-dir", default="vector_db_dir")
+    parser.add_argument("--workers", type=int, default=default_parse_workers(), help="parser processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--checkpoint-every", type=int, default=8, help="save progress every N embedding batches")
+    parser.add_argument("--index-mode", choices=("auto",) + INDEX_MODES, help="serving index type (default: INDEX_MODE)")
+    parser.add_argument("--recursive", action="store_true", help="also index files in subdirectories (never users' uploads)")
+    args = parser.parse_args()
+
+    index_dir = shared_index_dir(args.vector_db_dir)
+    # Set before the parser pool starts so every worker shares one page cache
+    os.environ.setdefault("PDF_PAGE_CACHE", os.path.join(args.vector_db_dir, "pdf_pages.sqlite3"))
+    started = time.perf_counter()
+
+    def progress(files_parsed, files_total, chunks_embedded):
+        elapsed = time.perf_counter() - started
+        print(
+            f"\r{files_parsed}/{files_total} files parsed, {chunks_embedded} chunks embedded "
+            f"({chunks_embedded / max(elapsed, 1e-9):.1f} chunks/s)",
+            end="",
+            flush=True
+        )
+
+    pool = new_parse_pool(args.workers) if args.workers else None
+    try:
+        success, message = ingest_directory(
+            args.data_dir,
+            index_dir,
+            text_splitter=LegalTextSplitter(chunk_size=args.chunk_size),
+            progress=progress,
+            parse_pool=pool,
+            checkpoint_every=args.checkpoint_every,
+            recursive=args.recursive,
+            skip_dir=is_user_dir,
+            index_mode=args.index_mode
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run to resume from the last checkpoint.")
+        sys.exit(130)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    print(f"\n{message} [{index_dir}, {time.perf_counter() - started:.1f}s]")
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()